@@ -0,0 +1,103 @@
+import time
+import random
+import numpy as np
+import neat
+from neat.activations import sigmoid_activation
+from neat.aggregations import sum_aggregation
+
+
+# A generation of FeedForwardNetworks packed into padded weight matrices so one call
+# activates every genome. Only sigmoid activation with sum aggregation is supported,
+# which is what config-feedforward uses.
+class BatchNetwork:
+    def __init__(self, networks):
+        self.num_networks = len(networks)
+        self.num_inputs = len(networks[0].input_nodes)
+        self.num_outputs = len(networks[0].output_nodes)
+
+        # Give every node a column: inputs first, then outputs, then hidden nodes
+        columns = []
+        for network in networks:
+            column = {key: i for i, key in enumerate(network.input_nodes + network.output_nodes)}
+            for node, act_func, agg_func, bias, response, links in network.node_evals:
+                if act_func is not sigmoid_activation or agg_func is not sum_aggregation:
+                    raise ValueError("BatchNetwork only supports sigmoid activation with sum aggregation")
+                if node not in column:
+                    column[node] = len(column)
+            columns.append(column)
+        size = max(len(column) for column in columns)
+
+        g = self.num_networks
+        self.weights = np.zeros((g, size, size))  # weights[g, node, source]
+        self.bias = np.zeros((g, size))
+        self.response = np.zeros((g, size))
+        self.layer = np.zeros((g, size), dtype=np.int64)  # 0 = input or never evaluated
+        for i, (network, column) in enumerate(zip(networks, columns)):
+            for node, act_func, agg_func, bias, response, links in network.node_evals:
+                c = column[node]
+                self.bias[i, c] = bias
+                self.response[i, c] = response
+                # A node runs one layer after the last of its sources
+                self.layer[i, c] = 1 + max([self.layer[i, column[source]] for source, w in links], default=0)
+                for source, w in links:
+                    self.weights[i, c, column[source]] = w
+        self.num_layers = int(self.layer.max())
+
+    def subset(self, keep):
+        # A BatchNetwork holding only the networks where keep is True
+        batch = BatchNetwork.__new__(BatchNetwork)
+        batch.__dict__.update(self.__dict__)
+        for name in ('weights', 'bias', 'response', 'layer'):
+            setattr(batch, name, getattr(self, name)[keep])
+        batch.num_networks = len(batch.bias)
+        return batch
+
+    def activate(self, inputs):
+        # inputs is (networks x num_inputs), returns (networks x num_outputs)
+        values = np.zeros(self.bias.shape)
+        values[:, :self.num_inputs] = inputs
+        for layer in range(1, self.num_layers + 1):
+            update = self.layer == layer
+            s = np.einsum('gns,gs->gn', self.weights, values)
+            z = np.clip(5.0 * (self.bias + self.response * s), -60.0, 60.0)
+            values = np.where(update, 1.0 / (1.0 + np.exp(-z)), values)
+        return values[:, self.num_inputs:self.num_inputs + self.num_outputs]
+
+
+def benchmark(config, num_genomes=1000, ticks=200, mutations=5):
+    # Time BatchNetwork against calling activate once per genome and check they agree
+    genomes = []
+    for key in range(num_genomes):
+        genome = config.genome_type(key)
+        genome.configure_new(config.genome_config)
+        for _ in range(mutations):
+            genome.mutate(config.genome_config)
+        genomes.append(genome)
+    networks = [neat.nn.FeedForwardNetwork.create(genome, config) for genome in genomes]
+    batch = BatchNetwork(networks)
+
+    rng = np.random.default_rng(0)
+    inputs = [rng.uniform(0, 20000, size=(num_genomes, batch.num_inputs)) for _ in range(ticks)]
+    for x in inputs:
+        x[:, 2] = rng.integers(0, 2, size=num_genomes)
+
+    start = time.perf_counter()
+    expected = [[network.activate(row.tolist()) for network, row in zip(networks, x)] for x in inputs]
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = [batch.activate(x) for x in inputs]
+    batch_time = time.perf_counter() - start
+
+    error = max(float(np.abs(np.array(e) - a).max()) for e, a in zip(expected, actual))
+    print("{0} genomes x {1} ticks, {2} layers".format(num_genomes, ticks, batch.num_layers))
+    print("per-genome activate: {0:.3f} sec".format(loop_time))
+    print("BatchNetwork.activate: {0:.3f} sec ({1:.1f}x faster)".format(batch_time, loop_time / batch_time))
+    print("max output difference: {0:.2e}".format(error))
+    return loop_time, batch_time, error
+
+
+if __name__ == '__main__':
+    import main
+    random.seed(0)
+    benchmark(main.load_config())
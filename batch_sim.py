@@ -0,0 +1,189 @@
+from time import perf_counter
+import numpy as np
+import neat
+
+from batch_net import BatchNetwork
+import simulation
+from simulation import DIRECTIONS, TICK_MS, MIN_TRIP_MS, MISSING_CAR_PENALTY, random_arrivals
+
+# Per-direction tables in the same order as DIRECTIONS, taken from simulation's so the two
+# engines can't drift apart. Each car only moves along one axis, so its position is a
+# single coordinate (x for east/west, y for north/south)
+START_POS = np.array([x if horizontal else y for (x, y), horizontal in zip(simulation.SPAWN_POS, simulation.HORIZONTAL)])
+VELOCITY = np.array(simulation.SPEED)
+MIDDLE = np.array(simulation.MIDDLE)  # Crossed the intersection past here
+EXIT_AT = VELOCITY * np.array(simulation.EXIT_POS)  # Off screen once velocity * pos > this
+AXIS = np.array([0 if axis == 'east-west' else 1 for axis in simulation.DIRECTION_AXIS])  # 0 = east/west road
+
+# Stop zone bounds for Car.move, lo/hi = base + slope * cars_at_time
+STOP_LO_BASE, STOP_LO_SLOPE, STOP_HI_BASE, STOP_HI_SLOPE = np.array(simulation.STOP_ZONES).T
+
+# (genomes x cars) arrays, one column per car in spawn order
+CAR_ARRAYS = ('pos', 'velocity', 'middle', 'exit_at', 'stop_lo', 'stop_hi', 'axis',
+              'direction', 'start_time', 'active', 'passed')
+# Per-genome arrays that shrink along with the car arrays as genomes finish
+ROW_ARRAYS = CAR_ARRAYS + ('light_state', 'buffer_time', 'rows')
+
+
+# Simulates one intersection per genome, all in lockstep, with cars stored as
+# (genomes x cars) arrays instead of Car objects. Matches IntersectionSim tick for tick.
+class BatchIntersectionSim:
+    def __init__(self, networks, seed=None, cars_to_finish=10, spawn_interval=800, arrivals=None, capacity=16):
+        self.batch_network = BatchNetwork(networks)
+        self.num_genomes = len(networks)
+        self.cars_to_finish = cars_to_finish
+        # (time, direction) pairs in time order, every genome sees the same traffic
+        self.arrivals = iter(arrivals) if arrivals is not None else random_arrivals(seed, spawn_interval)
+        self.next_arrival = next(self.arrivals, None)
+        self.ticks = 0
+        self.genome_ticks = 0  # Frames simulated, summed over genomes
+
+        g = self.num_genomes
+        self.rows = np.arange(g)  # Genomes still running, the arrays below only hold these rows
+        # Traffic light per genome, state 0 = east-west green, 1 = north-south green
+        self.light_state = np.zeros(g, dtype=np.int64)
+        self.buffer_time = np.zeros(g, dtype=np.int64)
+
+        for name in CAR_ARRAYS:
+            setattr(self, name, np.zeros((g, capacity), dtype=bool if name in ('active', 'passed') else np.int64))
+        self.spawned = 0  # Cars spawned so far, minus the columns already dropped
+
+        # Results for every genome, indexed by the original genome order
+        self.total_time = np.zeros(g, dtype=np.int64)
+        self.cars_finished = np.zeros(g, dtype=np.int64)
+        self.partial = np.full(g, np.nan)  # Fitness of genomes stopped early by a budget
+        self.best_fitness = 0.0  # Best fitness of the genomes that have finished
+
+    def get_inputs(self):
+        # Same inputs as IntersectionSim.get_inputs, one row per running genome
+        inputs = np.zeros((len(self.rows), 3))
+        inputs[:, 0] = (self.start_time * (self.active & (self.axis == 0))).sum(axis=1)
+        inputs[:, 1] = (self.start_time * (self.active & (self.axis == 1))).sum(axis=1)
+        inputs[:, 2] = self.light_state == 0
+        return inputs
+
+    def decide(self, inputs):
+        # Returns which genomes want to change their light this tick
+        output = self.batch_network.activate(inputs)[:, 0]
+        return (output > 0.5) | (output < 0.00001)
+
+    def _make_room(self):
+        # Drop leading columns with no live cars, doubling the capacity if that frees less than half
+        capacity = self.active.shape[1]
+        live = np.flatnonzero(self.active.any(axis=0))
+        first = live[0] if len(live) else capacity
+        new_capacity = capacity * 2 if first < capacity // 2 else capacity
+        for name in CAR_ARRAYS:
+            old = getattr(self, name)[:, first:]
+            new = np.zeros((old.shape[0], new_capacity), dtype=old.dtype)
+            new[:, :old.shape[1]] = old
+            setattr(self, name, new)
+        self.spawned -= first
+
+    def _drop_rows(self, drop):
+        # Stop simulating these genomes
+        keep = ~drop
+        for name in ROW_ARRAYS:
+            setattr(self, name, getattr(self, name)[keep])
+        self.batch_network = self.batch_network.subset(keep)
+
+    def spawn_car(self, direction):
+        d = DIRECTIONS.index(direction)
+        if self.spawned >= self.active.shape[1]:
+            self._make_room()
+        col = self.spawned
+        self.spawned += 1
+
+        # Cars in this direction that have not crossed yet, including the new one
+        cars_at_time = (self.active & ~self.passed & (self.direction == d)).sum(axis=1) + 1
+        self.pos[:, col] = START_POS[d]
+        self.velocity[:, col] = VELOCITY[d]
+        self.middle[:, col] = MIDDLE[d]
+        self.exit_at[:, col] = EXIT_AT[d]
+        self.stop_lo[:, col] = STOP_LO_BASE[d] + STOP_LO_SLOPE[d] * cars_at_time
+        self.stop_hi[:, col] = STOP_HI_BASE[d] + STOP_HI_SLOPE[d] * cars_at_time
+        self.axis[:, col] = AXIS[d]
+        self.direction[:, col] = d
+        self.start_time[:, col] = self.ticks
+        self.active[:, col] = True
+        self.passed[:, col] = False
+
+    def step(self):
+        self.genome_ticks += len(self.rows)
+
+        # Network decision and light update
+        change = self.decide(self.get_inputs()) & (self.buffer_time == 0)
+        self.buffer_time[change] = 2000
+        self.light_state[change] ^= 1
+        counting, overshot = self.buffer_time > 0, self.buffer_time < 0
+        self.buffer_time[counting] -= TICK_MS
+        self.buffer_time[overshot] = 0
+
+        if self.next_arrival is not None and self.ticks >= self.next_arrival[0]:
+            self.spawn_car(self.next_arrival[1])
+            self.next_arrival = next(self.arrivals, None)
+
+        # Cars that left the screen finish
+        finished = self.active & (self.velocity * self.pos > self.exit_at)
+        if finished.any():
+            self.total_time[self.rows] += ((self.ticks - self.start_time) * finished).sum(axis=1)
+            self.cars_finished[self.rows] += finished.sum(axis=1)
+            self.active &= ~finished
+
+        # Cars past the middle no longer count as waiting
+        self.passed |= self.active & (self.velocity * (self.pos - self.middle) > 0)
+
+        # Stop in the stop zone when the light is green for the other road
+        stopped = (self.stop_lo <= self.pos) & (self.pos <= self.stop_hi) & (self.axis != self.light_state[:, None])
+        self.pos += self.velocity * (self.active & ~stopped)
+
+        done = self.cars_finished[self.rows] >= self.cars_to_finish
+        if done.any():
+            finished = self.total_time[self.rows[done]]
+            self.best_fitness = max(self.best_fitness, 1 / (finished.min() / (4000 * self.cars_to_finish)))
+            self._drop_rows(done)
+        self.ticks += TICK_MS
+
+    def _stop_rows(self, stop):
+        # Give these genomes IntersectionSim.partial_fitness and stop simulating them
+        rows = self.rows[stop]
+        waited = ((self.ticks - self.start_time) * self.active)[stop].sum(axis=1)
+        missing = np.maximum(0, self.cars_to_finish - self.cars_finished[rows])
+        # Same operations as IntersectionSim's, so the result is the same to the last bit
+        self.partial[rows] = 1 / ((self.total_time[rows] + waited + missing * MISSING_CAR_PENALTY)
+                                  / (4000 * self.cars_to_finish))
+        self._drop_rows(stop)
+
+    def fitness(self):
+        with np.errstate(divide='ignore'):
+            fitness = 1 / (self.total_time / (4000 * self.cars_to_finish))
+        return np.where(np.isnan(self.partial), fitness, self.partial)
+
+    def run(self, max_ticks=None, max_seconds=None, early_abort=False):
+        # Budgets as in IntersectionSim.run. With early_abort a genome is stopped once it
+        # can't beat the best genome that already finished in this batch.
+        deadline = perf_counter() + max_seconds if max_seconds is not None else None
+        while len(self.rows):
+            if max_ticks is not None and self.ticks // TICK_MS >= max_ticks:
+                self._stop_rows(np.ones(len(self.rows), dtype=bool))
+            elif deadline is not None and perf_counter() > deadline:
+                self._stop_rows(np.ones(len(self.rows), dtype=bool))
+            elif early_abort and self.best_fitness > 0:
+                missing = np.maximum(0, self.cars_to_finish - self.cars_finished[self.rows])
+                best_possible = 1 / ((self.total_time[self.rows] + missing * MIN_TRIP_MS) / (4000 * self.cars_to_finish))
+                hopeless = best_possible < self.best_fitness
+                if hopeless.any():
+                    self._stop_rows(hopeless)
+            if len(self.rows):
+                self.step()
+        return self.fitness()
+
+
+def eval_genomes(genomes, config, seed=None, arrivals=None, max_ticks=None, max_seconds=None, early_abort=False,
+                 cars_to_finish=10):
+    # Evaluate a whole generation at once, every genome on the same traffic
+    networks = [neat.nn.FeedForwardNetwork.create(genome, config) for genome_id, genome in genomes]
+    sim = BatchIntersectionSim(networks, seed=seed, cars_to_finish=cars_to_finish, arrivals=arrivals)
+    fitnesses = sim.run(max_ticks, max_seconds, early_abort)
+    for (genome_id, genome), fitness in zip(genomes, fitnesses):
+        genome.fitness = float(fitness)
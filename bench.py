@@ -0,0 +1,173 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import subprocess
+import neat
+
+import main
+from simulation import IntersectionSim, TICK_MS
+from event_sim import EventIntersectionSim
+from batch_sim import BatchIntersectionSim
+
+# Metrics where higher is better, checked against the baseline
+METRICS = ('ticks_per_sec', 'evals_per_sec', 'generations_per_sec')
+# What a worker process imports before it can evaluate: distributed.py workers import main
+STARTUP_MODULES = ('main', 'distributed')
+
+
+def simulate(engine, genomes, config, cars_to_finish, spawn_interval, seed):
+    # Set fitness on every genome and return the number of frames simulated
+    networks = [neat.nn.FeedForwardNetwork.create(genome, config) for genome_id, genome in genomes]
+    if engine == 'batch':
+        sim = BatchIntersectionSim(networks, seed=seed, cars_to_finish=cars_to_finish, spawn_interval=spawn_interval)
+        for (genome_id, genome), fitness in zip(genomes, sim.run()):
+            genome.fitness = float(fitness)
+        return sim.genome_ticks
+
+    ticks = 0
+    for (genome_id, genome), network in zip(genomes, networks):
+        if engine == 'event':
+            sim = EventIntersectionSim(network, seed=seed, cars_to_finish=cars_to_finish, spawn_interval=spawn_interval)
+            genome.fitness = sim.run()
+            ticks += sim.tick + 1
+        else:
+            sim = IntersectionSim(network, seed=seed, cars_to_finish=cars_to_finish, spawn_interval=spawn_interval)
+            genome.fitness = sim.run()
+            ticks += sim.clock.get_ticks() // TICK_MS
+    return ticks
+
+
+def bench_case(engine, pop_size, cars_to_finish, spawn_interval, generations, seed):
+    # Evolve for a few generations headless and time it
+    random.seed(seed)
+    config = main.load_config()
+    config.pop_size = pop_size
+    config.fitness_threshold = float('inf')  # Always run every generation
+    population = neat.Population(config)
+
+    totals = {'ticks': 0, 'evals': 0, 'eval_time': 0.0}
+
+    def evaluate(genomes, config):
+        start = time.perf_counter()
+        totals['ticks'] += simulate(engine, genomes, config, cars_to_finish, spawn_interval, seed)
+        totals['eval_time'] += time.perf_counter() - start
+        totals['evals'] += len(genomes)
+
+    start = time.perf_counter()
+    population.run(evaluate, generations)
+    run_time = time.perf_counter() - start
+
+    return {
+        'engine': engine,
+        'pop_size': pop_size,
+        'cars_to_finish': cars_to_finish,
+        'spawn_interval': spawn_interval,
+        'generations': generations,
+        'seed': seed,
+        'ticks': totals['ticks'],
+        'evals': totals['evals'],
+        'ticks_per_sec': totals['ticks'] / totals['eval_time'],
+        'evals_per_sec': totals['evals'] / totals['eval_time'],
+        'generations_per_sec': generations / run_time,
+    }
+
+
+def startup_time(module, repeat=5):
+    # Seconds for a fresh headless interpreter to import module, best of repeat, less the
+    # interpreter's own startup. Every worker process pays this before its first genome.
+    def best(code):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-c', code], check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                           env=dict(os.environ, TRAFFIC_HEADLESS='1'))
+            times.append(time.perf_counter() - start)
+        return min(times)
+    return best('import ' + module) - best('pass')
+
+
+def case_key(case):
+    return (case['engine'], case['pop_size'], case['cars_to_finish'], case['spawn_interval'])
+
+
+def compare(results, baseline, threshold):
+    # Returns a message for every metric that fell more than threshold below the baseline
+    previous = {case_key(case): case for case in baseline['cases']}
+    regressions = []
+    for module, seconds in results.get('startup', {}).items():
+        old = baseline.get('startup', {}).get(module)
+        if old is not None and seconds > old * (1 + threshold):
+            regressions.append("import {0}: {1:.3f}s vs baseline {2:.3f}s ({3:+.0%})".format(
+                module, seconds, old, seconds / old - 1))
+    for case in results['cases']:
+        old = previous.get(case_key(case))
+        if old is None:
+            continue
+        for metric in METRICS:
+            if case[metric] < old[metric] * (1 - threshold):
+                regressions.append("{0} {1}: {2:.1f} vs baseline {3:.1f} ({4:+.0%})".format(
+                    case_key(case), metric, case[metric], old[metric], case[metric] / old[metric] - 1))
+    return regressions
+
+
+def int_list(text):
+    return [int(value) for value in text.split(',')]
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark simulation and evolution throughput")
+    parser.add_argument('--engines', default='tick,event,batch')
+    parser.add_argument('--pop-sizes', type=int_list, default=[10, 50])
+    parser.add_argument('--cars', type=int_list, default=[10, 20], help="cars to finish per genome")
+    parser.add_argument('--intervals', type=int_list, default=[800, 400], help="milliseconds between cars")
+    parser.add_argument('--generations', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='bench_results.json')
+    parser.add_argument('--baseline', help="fail if a metric is worse than this results file by more than --threshold")
+    parser.add_argument('--threshold', type=float, default=0.2)
+    parser.add_argument('--save-baseline', help="also write the results here to compare future runs against")
+    parser.add_argument('--startup-only', action='store_true', help="only time worker startup")
+    args = parser.parse_args(argv)
+    if args.baseline and not os.path.exists(args.baseline):
+        parser.error("no baseline file {0}".format(args.baseline))  # Found out before the benchmark runs
+
+    startup = {}
+    for module in STARTUP_MODULES:
+        startup[module] = startup_time(module)
+        print("startup: import {0:12} {1:6.3f}s".format(module, startup[module]))
+
+    cases = []
+    for engine in args.engines.split(',') if not args.startup_only else []:
+        for pop_size in args.pop_sizes:
+            for cars_to_finish in args.cars:
+                for spawn_interval in args.intervals:
+                    case = bench_case(engine, pop_size, cars_to_finish, spawn_interval, args.generations, args.seed)
+                    print("{0:5} pop={1:<4} cars={2:<3} interval={3:<5} {4:12.0f} ticks/s {5:9.1f} evals/s "
+                          "{6:7.2f} gens/s".format(engine, pop_size, cars_to_finish, spawn_interval, case['ticks_per_sec'],
+                                                   case['evals_per_sec'], case['generations_per_sec']))
+                    cases.append(case)
+
+    results = {'python': platform.python_version(), 'machine': platform.machine(), 'time': time.time(),
+               'startup': startup, 'cases': cases}
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
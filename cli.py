@@ -0,0 +1,68 @@
+import os
+import sys
+import argparse
+
+# Entry point: python cli.py train|replay|bench ...
+# Only the chosen command's modules are imported, so replay and bench never load NEAT
+# training features they don't use, and only rendering loads pygame.
+
+# train options, the main.py settings they set and how argparse checks them, so bad values
+# fail here rather than inside main. Anything else can still be set in the environment.
+TRAIN_SETTINGS = (('--seed', 'TRAFFIC_SEED', {'type': int}),
+                  ('--engine', 'TRAFFIC_ENGINE', {'choices': ['tick', 'event', 'batch', 'grid']}),
+                  ('--workers', 'TRAFFIC_WORKERS', {'type': int}),
+                  ('--scenario', 'TRAFFIC_SCENARIO', {}),
+                  ('--record', 'TRAFFIC_RECORD', {}),
+                  ('--export', 'TRAFFIC_EXPORT', {}),
+                  ('--max-ticks', 'TRAFFIC_MAX_TICKS', {'type': int}))
+
+
+def train(args, rest):
+    # main reads its settings from the environment when imported, and worker processes
+    # inherit them from there too
+    os.environ['TRAFFIC_HEADLESS'] = '0' if args.render else '1'
+    for option, name, checks in TRAIN_SETTINGS:
+        value = getattr(args, option[2:].replace('-', '_'))
+        if value is not None:
+            os.environ[name] = str(value)
+    if rest:
+        sys.exit("unrecognized arguments: " + " ".join(rest))
+    import main
+    main.run(args.generations)
+    return 0
+
+
+def replay(args, rest):
+    import replay
+    replay.main_cli(rest)
+    return 0
+
+
+def bench(args, rest):
+    import bench
+    return bench.main_cli(rest)
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Train traffic light controllers with NEAT")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    train_parser = commands.add_parser('train', help="evolve a controller, headless unless --render")
+    train_parser.add_argument('--generations', type=int, default=5)
+    train_parser.add_argument('--render', action='store_true', help="draw every evaluation in a window")
+    for option, name, checks in TRAIN_SETTINGS:
+        train_parser.add_argument(option, help="sets {0}".format(name), **checks)
+    train_parser.set_defaults(handler=train)
+
+    # replay and bench take their own modules' arguments
+    commands.add_parser('replay', help="play recorded runs, see replay.py --help",
+                        add_help=False).set_defaults(handler=replay)
+    commands.add_parser('bench', help="benchmark throughput and worker startup, see bench.py --help",
+                        add_help=False).set_defaults(handler=bench)
+
+    args, rest = parser.parse_known_args(argv)
+    return args.handler(args, rest)
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
@@ -0,0 +1,235 @@
+import os
+import sys
+import queue
+import socket
+import argparse
+import ipaddress
+import itertools
+import threading
+import multiprocessing
+from multiprocessing.connection import Listener, Client
+
+# Messages are pickled tuples over multiprocessing.connection, which frames them and checks
+# the authkey. Coordinator to worker: ('config', config, settings), ('evaluate', batch_id,
+# [(genome_id, genome), ...]) and ('stop',). Worker to coordinator: ('heartbeat',) while it
+# evaluates, ('result', batch_id, [(genome_id, fitness), ...]) when done and ('refused',
+# settings) when its own evaluation settings differ from the coordinator's.
+# Both ends unpickle what they receive, so the authkey is all that keeps anyone who can
+# reach the port from running code on them. It has to be a shared secret.
+
+
+def parse_address(text):
+    host, port = text.rsplit(':', 1)
+    return host, int(port)
+
+
+def load_authkey(path=None):
+    # The shared secret from a file, or else from TRAFFIC_AUTHKEY, None when neither is set
+    if path is not None:
+        with open(path, 'rb') as f:
+            return f.read().strip()
+    key = os.environ.get('TRAFFIC_AUTHKEY')
+    return key.encode() if key else None
+
+
+def is_loopback(host):
+    return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+
+
+# Hands out batches of genomes to workers that connect over TCP and collects their fitness.
+# A worker that disconnects, or sends nothing for heartbeat_timeout seconds while it holds a
+# batch, is dropped and its batch goes back on the queue for another worker. Without an
+# authkey it only listens on loopback, with a random key that start_local_workers passes on.
+class Coordinator:
+    def __init__(self, address=('127.0.0.1', 0), authkey=None, batch_size=4, heartbeat_timeout=10.0,
+                 worker_timeout=None, settings=None):
+        if authkey is None:
+            if not is_loopback(address[0]):
+                raise ValueError("set TRAFFIC_AUTHKEY to listen on {0}, workers on other hosts need "
+                                 "the same key".format(address[0]))
+            authkey = os.urandom(32)
+        self.authkey = authkey
+        self.listener = Listener(address, authkey=authkey)
+        self.address = self.listener.address  # With port 0 the OS picks one
+        self.batch_size = batch_size
+        self.heartbeat_timeout = heartbeat_timeout
+        self.worker_timeout = worker_timeout  # Seconds evaluate waits with no worker connected, None = forever
+        self.settings = settings  # What fitness depends on besides the genome, workers must have the same
+        self.batches = queue.Queue()  # (batch_id, genomes) waiting for a worker
+        self.lock = threading.Condition()
+        self.outstanding = {}  # batch_id -> genomes, for the generation being evaluated
+        self.config = None
+        self.workers = 0  # Connected workers
+        self.requeued = 0
+        self.batch_ids = itertools.count()
+        self.closed = False
+        threading.Thread(target=self.accept, daemon=True).start()
+
+    def accept(self):
+        while not self.closed:
+            try:
+                conn = self.listener.accept()
+            except (OSError, EOFError):
+                continue  # Failed handshake, or the listener was closed
+            with self.lock:
+                self.workers += 1
+            threading.Thread(target=self.serve, args=(conn,), daemon=True).start()
+
+    def serve(self, conn):
+        # Feeds one worker until it dies or the coordinator stops
+        config_sent = None
+        batch = None
+        try:
+            while True:
+                batch = self.batches.get()
+                if batch is None:
+                    conn.send(('stop',))
+                    return
+                batch_id, genomes = batch
+                if self.config is not config_sent:
+                    conn.send(('config', self.config, self.settings))
+                    config_sent = self.config
+                conn.send(('evaluate', batch_id, genomes))
+                while True:
+                    if not conn.poll(self.heartbeat_timeout):
+                        raise TimeoutError("worker missed its heartbeat")
+                    message = conn.recv()
+                    if message[0] == 'result':
+                        self.finish(message[1], message[2])
+                        break
+                    if message[0] == 'refused':
+                        print("Dropped a worker with different settings: {0!r}, expected {1!r}".format(
+                            message[1], self.settings))
+                        raise ConnectionAbortedError("worker settings differ")
+                batch = None
+        except (OSError, EOFError, TimeoutError):
+            if batch is not None:
+                with self.lock:
+                    if batch[0] in self.outstanding:
+                        self.requeued += 1
+                        self.batches.put(batch)
+        finally:
+            conn.close()
+            with self.lock:
+                self.workers -= 1
+
+    def finish(self, batch_id, results):
+        with self.lock:
+            genomes = self.outstanding.pop(batch_id, None)
+            if genomes is None:
+                return  # Already done by another worker after a requeue
+            fitness = dict(results)
+            for genome_id, genome in genomes:
+                genome.fitness = fitness[genome_id]
+            self.lock.notify_all()
+
+    def evaluate(self, genomes, config):
+        # population.run fitness function
+        self.config = config
+        genomes = list(genomes)
+        with self.lock:
+            for i in range(0, len(genomes), self.batch_size):
+                batch_id = next(self.batch_ids)
+                self.outstanding[batch_id] = genomes[i:i + self.batch_size]
+                self.batches.put((batch_id, genomes[i:i + self.batch_size]))
+            idle = 0.0  # Seconds waited with no worker connected
+            while self.outstanding:
+                if self.lock.wait(self.heartbeat_timeout) or self.workers > 0:
+                    idle = 0.0
+                    continue
+                idle += self.heartbeat_timeout
+                if self.worker_timeout is not None and idle >= self.worker_timeout:
+                    raise RuntimeError("no workers connected to {0}:{1} for {2:.0f}s".format(
+                        self.address[0], self.address[1], idle))
+                print("Waiting for workers to connect to {0}:{1}, {2} batches left".format(
+                    self.address[0], self.address[1], len(self.outstanding)))
+
+    def stop(self):
+        self.closed = True
+        with self.lock:
+            for _ in range(self.workers):
+                self.batches.put(None)
+        self.listener.close()
+
+
+def run_worker(address, eval_function, authkey, settings=None, heartbeat_interval=1.0):
+    # Evaluate batches from the coordinator at address with eval_function(genome, config)
+    # until told to stop. A second thread sends heartbeats while a batch is running. settings
+    # are what eval_function's fitness depends on, the worker refuses to evaluate and returns
+    # False if the coordinator's differ.
+    conn = Client(address, authkey=authkey)
+    send_lock = threading.Lock()
+    busy = threading.Event()
+    done = threading.Event()
+
+    def heartbeat():
+        while not done.wait(heartbeat_interval):
+            if busy.is_set():
+                with send_lock:
+                    if done.is_set():
+                        return  # The connection is closed
+                    try:
+                        conn.send(('heartbeat',))
+                    except OSError:
+                        return  # Dropped by the coordinator, the main loop finds out on its next send or recv
+
+    threading.Thread(target=heartbeat, daemon=True).start()
+    config = None
+    try:
+        while True:
+            message = conn.recv()
+            if message[0] == 'stop':
+                break
+            elif message[0] == 'config':
+                config = message[1]
+                if message[2] != settings:
+                    print("Refusing to evaluate: the coordinator's settings {0!r} differ from this worker's "
+                          "{1!r}".format(message[2], settings))
+                    with send_lock:
+                        conn.send(('refused', settings))
+                    return False
+            elif message[0] == 'evaluate':
+                batch_id, genomes = message[1], message[2]
+                busy.set()
+                results = [(genome_id, eval_function(genome, config)) for genome_id, genome in genomes]
+                busy.clear()
+                with send_lock:
+                    conn.send(('result', batch_id, results))
+    except (EOFError, OSError):
+        pass  # Coordinator went away, or dropped this worker for missing its heartbeats
+    finally:
+        with send_lock:
+            done.set()
+            conn.close()
+    return True
+
+
+def main_worker(address, authkey):
+    # Entry point for worker processes, evaluates with main.eval_genome. The worker's TRAFFIC_*
+    # settings must match the training process's, it exits with status 1 if they don't.
+    import main
+    if not run_worker(address, main.eval_genome, authkey, main.evaluation_settings()):
+        sys.exit(1)
+
+
+def start_local_workers(address, count, authkey):
+    # Worker processes on this machine, for single-host runs and trying things out
+    workers = []
+    for _ in range(count):
+        process = multiprocessing.Process(target=main_worker, args=(address, authkey), daemon=True)
+        process.start()
+        workers.append(process)
+    return workers
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Evaluate genomes for a coordinator started by main.py")
+    parser.add_argument('address', help="host:port of the coordinator (TRAFFIC_COORDINATOR)")
+    parser.add_argument('--processes', type=int, default=1, help="worker processes to run on this host")
+    parser.add_argument('--authkey-file', help="file with the coordinator's key, instead of TRAFFIC_AUTHKEY")
+    args = parser.parse_args()
+    authkey = load_authkey(args.authkey_file)
+    if authkey is None:
+        parser.error("the coordinator's key is needed, set TRAFFIC_AUTHKEY or pass --authkey-file")
+    for process in start_local_workers(parse_address(args.address), args.processes, authkey):
+        process.join()
@@ -0,0 +1,213 @@
+import heapq
+from time import perf_counter
+
+import simulation
+from simulation import DIRECTIONS, TICK_MS, MIN_TRIP_MS, MISSING_CAR_PENALTY, TrafficLight, random_arrivals
+
+# Positions are measured along each car's direction of travel (u = x or -x, y or -y),
+# so every moving car gains SPEED per tick. The tables are simulation's, the ones Car.move,
+# Car.passedIntersection and Car.off_screen use, turned into travel coordinates.
+SPEED = abs(simulation.SPEED[0])
+SIGN = {direction: simulation.SPEED[d] // SPEED for d, direction in enumerate(DIRECTIONS)}
+START = {direction: SIGN[direction] * (x if horizontal else y) for direction, (x, y), horizontal
+         in zip(DIRECTIONS, simulation.SPAWN_POS, simulation.HORIZONTAL)}
+MIDDLE = {direction: SIGN[direction] * middle for direction, middle in zip(DIRECTIONS, simulation.MIDDLE)}
+EXIT = {direction: SIGN[direction] * exit_pos for direction, exit_pos in zip(DIRECTIONS, simulation.EXIT_POS)}
+AXIS = dict(zip(DIRECTIONS, simulation.DIRECTION_AXIS))
+
+
+def stop_zone(direction, cars_at_time):
+    # The range Car.move stops in on a red light, in travel coordinates
+    lo_base, lo_slope, hi_base, hi_slope = simulation.STOP_ZONES[DIRECTIONS.index(direction)]
+    lo, hi = lo_base + lo_slope * cars_at_time, hi_base + hi_slope * cars_at_time
+    return (lo, hi) if SIGN[direction] > 0 else (-hi, -lo)
+
+
+def buffer_ticks():
+    # Ticks after a change until TrafficLight allows the next one
+    light = TrafficLight()
+    light.change()
+    ticks = 0
+    while True:
+        light.update()
+        ticks += 1
+        if light.buffer_time == 0:
+            return ticks
+
+
+BUFFER_TICKS = buffer_ticks()
+
+
+# A car whose position is worked out from the tick it was last anchored at,
+# instead of being moved every tick
+class EventCar:
+    def __init__(self, direction, tick, cars_at_time):
+        self.direction = direction
+        self.start_time = tick * TICK_MS
+        self.stop_lo, self.stop_hi = stop_zone(direction, cars_at_time)
+        self.u = START[direction]  # Position at the start of self.tick
+        self.tick = tick
+        self.stop_after = None  # Moves left before stopping at a red light, None = never stops
+        self.exit_tick = None  # Tick it is found off screen, None while waiting at a red light
+        self.cross_tick = None  # First tick it is past the middle of the intersection
+
+    def position(self, tick):
+        moves = tick - self.tick
+        if self.stop_after is not None:
+            moves = min(moves, self.stop_after)
+        return self.u + SPEED * moves
+
+    def passed(self, tick):
+        # Whether passedIntersection has marked this car by the start of tick
+        return self.cross_tick is not None and self.cross_tick < tick
+
+    def set_light(self, tick, red):
+        # Re-anchor at tick and work out when it stops, crosses and leaves under the new light
+        self.u = self.position(tick)
+        self.tick = tick
+        self.stop_after = None
+        if red and self.u <= self.stop_hi:
+            steps = max(0, -((self.u - self.stop_lo) // SPEED))
+            if self.u + SPEED * steps <= self.stop_hi:
+                self.stop_after = steps
+
+        if self.stop_after is None:
+            self.exit_tick = tick + max(0, (EXIT[self.direction] - self.u) // SPEED + 1)
+            if self.cross_tick is None or self.cross_tick >= tick:
+                self.cross_tick = tick + max(0, (MIDDLE[self.direction] - self.u) // SPEED + 1)
+        else:
+            self.exit_tick = None
+            if self.cross_tick is not None and self.cross_tick >= tick:
+                self.cross_tick = None
+
+
+# Same model as IntersectionSim, but instead of stepping every 30 ms it jumps between
+# the ticks where something happens: a car arrives or leaves, or the light changes.
+# The network is only asked again when its inputs have changed.
+class EventIntersectionSim:
+    def __init__(self, network, seed=None, cars_to_finish=10, spawn_interval=800, arrivals=None):
+        self.network = network
+        self.cars_to_finish = cars_to_finish
+        # (time, direction) pairs in time order, random traffic from seed unless given
+        self.arrivals = iter(arrivals) if arrivals is not None else random_arrivals(seed, spawn_interval)
+
+        self.light_state = 'east-west'
+        self.ready_tick = 0  # First tick the light may change again
+        self.lanes = {direction: [] for direction in DIRECTIONS}
+        self.sum_start_time = {'east-west': 0, 'north-south': 0}
+        self.exits = []  # Heap of (exit_tick, order, car)
+        self.order = 0
+        self.total_time = 0
+        self.cars_finished = 0
+        self.next_arrival = None
+        self.next_spawn = None  # Tick the next car appears on, None once arrivals run out
+        self.wants_change = False
+        self.tick = 0
+
+    def get_inputs(self):
+        light_state = 1 if self.light_state == 'east-west' else 0
+        return [float(self.sum_start_time['east-west']), float(self.sum_start_time['north-south']), light_state]
+
+    def decide(self):
+        output = self.network.activate(self.get_inputs())
+        return output[0] > 0.5 or output[0] < 0.00001
+
+    def schedule(self, car, tick):
+        car.set_light(tick, AXIS[car.direction] != self.light_state)
+        if car.exit_tick is not None:
+            heapq.heappush(self.exits, (car.exit_tick, self.order, car))
+            self.order += 1
+
+    def queue_arrival(self, earliest):
+        # The tick engine spawns at most one car per frame, on the first frame at or after its arrival time
+        self.next_arrival = next(self.arrivals, None)
+        if self.next_arrival is not None:
+            self.next_spawn = max(earliest, -(-self.next_arrival[0] // TICK_MS))
+        else:
+            self.next_spawn = None
+
+    def spawn_car(self, tick):
+        direction = self.next_arrival[1]
+        lane = self.lanes[direction]
+        waiting = sum(1 for car in lane if not car.passed(tick))
+        car = EventCar(direction, tick, waiting + 1)
+        lane.append(car)
+        self.sum_start_time[AXIS[direction]] += car.start_time
+        self.schedule(car, tick)
+        self.queue_arrival(tick + 1)
+
+    def process(self, tick):
+        # Everything the tick engine would do at this tick
+        changed = False
+        if self.wants_change and tick >= self.ready_tick:
+            self.light_state = 'north-south' if self.light_state == 'east-west' else 'east-west'
+            self.ready_tick = tick + BUFFER_TICKS
+            for lane in self.lanes.values():
+                for car in lane:
+                    self.schedule(car, tick)
+            changed = True
+
+        if tick == self.next_spawn:
+            self.spawn_car(tick)
+            changed = True
+
+        while self.exits and self.exits[0][0] == tick:
+            exit_tick, order, car = heapq.heappop(self.exits)
+            if car.exit_tick != exit_tick:
+                continue  # Rescheduled by a light change
+            self.total_time += tick * TICK_MS - car.start_time
+            self.cars_finished += 1
+            self.lanes[car.direction].remove(car)
+            self.sum_start_time[AXIS[car.direction]] -= car.start_time
+            car.exit_tick = None
+            changed = True
+
+        if changed:
+            self.wants_change = self.decide()
+
+    def next_event(self, tick):
+        while self.exits and self.exits[0][2].exit_tick != self.exits[0][0]:
+            heapq.heappop(self.exits)  # Drop stale entries
+        candidates = [self.next_spawn] if self.next_spawn is not None else []
+        if self.exits:
+            candidates.append(self.exits[0][0])
+        if self.wants_change:
+            candidates.append(max(tick + 1, self.ready_tick))
+        return min(candidates)
+
+    def fitness(self):
+        return 1 / (self.total_time / (4000 * self.cars_to_finish))
+
+    def partial_fitness(self, tick):
+        # Same as IntersectionSim.partial_fitness at the start of tick
+        on_road = sum(len(lane) for lane in self.lanes.values())
+        waited = on_road * tick * TICK_MS - sum(self.sum_start_time.values())
+        missing = max(0, self.cars_to_finish - self.cars_finished)
+        return 1 / ((self.total_time + waited + missing * MISSING_CAR_PENALTY) / (4000 * self.cars_to_finish))
+
+    def best_possible_fitness(self):
+        missing = max(0, self.cars_to_finish - self.cars_finished)
+        return 1 / ((self.total_time + missing * MIN_TRIP_MS) / (4000 * self.cars_to_finish))
+
+    def run(self, max_ticks=None, max_seconds=None, abort_below=None):
+        # Budgets work as in IntersectionSim.run and stop on the same tick it would
+        deadline = perf_counter() + max_seconds if max_seconds is not None else None
+        self.stopped = None
+        self.queue_arrival(0)
+        self.wants_change = self.decide()
+        while True:
+            self.process(self.tick)
+            if self.cars_finished >= self.cars_to_finish:
+                return self.fitness()  # self.tick is left on the last tick simulated
+            next_tick = self.next_event(self.tick)
+            if max_ticks is not None and self.tick + 1 >= max_ticks:
+                self.stopped, stop_tick = 'ticks', max_ticks
+            elif deadline is not None and perf_counter() > deadline:
+                self.stopped, stop_tick = 'time', self.tick + 1
+            elif abort_below is not None and self.best_possible_fitness() < abort_below:
+                self.stopped, stop_tick = 'abort', self.tick + 1
+            elif max_ticks is not None and next_tick >= max_ticks:
+                self.stopped, stop_tick = 'ticks', max_ticks
+            if self.stopped is not None:
+                return self.partial_fitness(stop_tick)
+            self.tick = next_tick
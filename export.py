@@ -0,0 +1,149 @@
+import sys
+import pickle
+import random
+import inspect
+import argparse
+import importlib.util
+from time import perf_counter_ns
+import neat
+from neat.activations import sigmoid_activation
+from neat.aggregations import sum_aggregation, product_aggregation, max_aggregation, min_aggregation
+
+INPUT_NAMES = ('cars_waiting_ew', 'cars_waiting_ns', 'light_state')  # IntersectionSim.get_inputs order
+
+
+def var(key):
+    return "n{0}".format(key) if key >= 0 else "i{0}".format(-key)
+
+
+def aggregate_expression(agg_func, terms):
+    # The aggregation as arithmetic, in the same order as neat's so results match bit for bit
+    if agg_func is sum_aggregation:
+        return " + ".join(terms) if terms else "0"
+    if agg_func is product_aggregation:
+        return " * ".join(["1.0"] + terms)
+    if agg_func is max_aggregation:
+        return "max({0})".format(", ".join(terms)) if len(terms) > 1 else terms[0]
+    if agg_func is min_aggregation:
+        return "min({0})".format(", ".join(terms)) if len(terms) > 1 else terms[0]
+    raise ValueError("can't export aggregation {0}".format(agg_func.__name__))
+
+
+def controller_source(network, description=""):
+    # A Python module with activate() and change_light() that compute what network.activate
+    # and IntersectionSim.step would, as straight-line code with the weights written in
+    lines = []
+    helpers = {}
+    for node, act_func, agg_func, bias, response, links in network.node_evals:
+        terms = ["{0} * {1!r}".format(var(source), w) for source, w in links]
+        lines.append("    z = {0!r} + {1!r} * ({2})".format(bias, response, aggregate_expression(agg_func, terms)))
+        if act_func is sigmoid_activation:
+            # sigmoid_activation inlined
+            lines.append("    z = 5.0 * z")
+            lines.append("    z = -60.0 if z < -60.0 else (60.0 if z > 60.0 else z)")
+            lines.append("    {0} = 1.0 / (1.0 + exp(-z))".format(var(node)))
+        else:
+            helpers[act_func.__name__] = inspect.getsource(act_func)
+            lines.append("    {0} = {1}(z)".format(var(node), act_func.__name__))
+
+    evaluated = {node for node, act_func, agg_func, bias, response, links in network.node_evals}
+    outputs = [var(key) if key in evaluated else "0.0" for key in network.output_nodes]
+    arguments = ", ".join(INPUT_NAMES[:len(network.input_nodes)])
+
+    source = ["# Traffic light controller exported by export.py{0}.".format(description),
+              "# Needs nothing but the standard library.",
+              "import math",
+              "from math import exp",
+              "", ""]
+    for name in sorted(helpers):
+        source += [helpers[name].rstrip(), "", ""]
+    source.append("def activate({0}):".format(arguments))
+    for key, name in zip(network.input_nodes, INPUT_NAMES):
+        source.append("    {0} = {1}".format(var(key), name))
+    source += lines
+    source.append("    return {0}".format(outputs[0] if len(outputs) == 1 else "({0},)".format(", ".join(outputs))))
+    source += ["", "",
+               "def change_light({0}):".format(arguments),
+               "    # The decision IntersectionSim.step makes from the first output",
+               "    output = activate({0})".format(arguments) + ("" if len(outputs) == 1 else "[0]"),
+               "    return output > 0.5 or output < 0.00001",
+               ""]
+    return "\n".join(source)
+
+
+def export_controller(genome, config, path):
+    network = neat.nn.FeedForwardNetwork.create(genome, config)
+    description = " from genome {0} (fitness {1})".format(genome.key, genome.fitness)
+    with open(path, 'w') as f:
+        f.write(controller_source(network, description))
+    return network
+
+
+def load_controller(path):
+    spec = importlib.util.spec_from_file_location('controller', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def sample_inputs(count=20000, seed=0):
+    # Inputs across the range the simulator produces: summed start times of up to a few
+    # dozen cars over a long run, zero and tiny values, and both light states
+    rng = random.Random(seed)
+    edges = [0.0, 1.0, 30.0, 800.0, 4000.0, 40000.0, 600000.0, 2000000.0]
+    samples = [(ew, ns, light) for ew in edges for ns in edges for light in (0, 1)]
+    while len(samples) < count:
+        scale = 10 ** rng.uniform(0, 6.5)
+        samples.append((float(int(rng.uniform(0, scale))), float(int(rng.uniform(0, scale))), rng.randint(0, 1)))
+    return samples
+
+
+def check_equivalence(network, controller, samples):
+    # Returns (mismatches, largest difference) between the controller and network.activate
+    mismatches = 0
+    largest = 0.0
+    for inputs in samples:
+        expected = network.activate(list(inputs))
+        got = controller.activate(*inputs)
+        got = got if isinstance(got, tuple) else (got,)
+        for a, b in zip(expected, got):
+            if a != b:
+                mismatches += 1
+                largest = max(largest, abs(a - b))
+    return mismatches, largest
+
+
+def latency(decide, samples, repeat=5):
+    # Nanoseconds per decision, best of repeat passes over the samples
+    best = None
+    for _ in range(repeat):
+        start = perf_counter_ns()
+        for inputs in samples:
+            decide(inputs)
+        elapsed = (perf_counter_ns() - start) / len(samples)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def report(network, controller):
+    samples = sample_inputs()
+    mismatches, largest = check_equivalence(network, controller, samples)
+    print("Equivalence: {0} mismatches over {1} inputs (largest difference {2})".format(
+        mismatches, len(samples), largest))
+    network_ns = latency(lambda inputs: network.activate(list(inputs)), samples)
+    controller_ns = latency(lambda inputs: controller.change_light(*inputs), samples)
+    print("Latency: network.activate {0:.0f} ns, exported change_light {1:.0f} ns per decision".format(
+        network_ns, controller_ns))
+    return mismatches == 0
+
+
+if __name__ == '__main__':
+    import main
+    parser = argparse.ArgumentParser(description="Export a pickled genome as a standalone controller module")
+    parser.add_argument('genome', help="pickled genome, as main.py writes next to TRAFFIC_EXPORT")
+    parser.add_argument('out', help="controller module to write")
+    args = parser.parse_args()
+    with open(args.genome, 'rb') as f:
+        genome = pickle.load(f)
+    network = export_controller(genome, main.load_config(), args.out)
+    sys.exit(0 if report(network, load_controller(args.out)) else 1)
@@ -0,0 +1,99 @@
+import hashlib
+import sqlite3
+from collections import OrderedDict
+
+from neat.reporting import BaseReporter
+
+
+def genome_key(genome, scenario):
+    # Hash of everything that changes how the network behaves: enabled connections with
+    # their weights and each node's bias, response, activation and aggregation, plus the
+    # traffic it is evaluated on. Disabled connections are left out.
+    parts = [str(scenario)]
+    for key in sorted(genome.connections):
+        connection = genome.connections[key]
+        if connection.enabled:
+            parts.append("c{0},{1}:{2!r}".format(key[0], key[1], connection.weight))
+    for key in sorted(genome.nodes):
+        node = genome.nodes[key]
+        parts.append("n{0}:{1!r},{2!r},{3},{4}".format(key, node.bias, node.response, node.activation, node.aggregation))
+    return hashlib.sha1(";".join(parts).encode()).hexdigest()
+
+
+# Remembers fitness by genome_key. Keeps the most recent maxsize entries in memory and,
+# when given a path, every entry in an SQLite file so they survive restarts.
+class FitnessCache:
+    def __init__(self, maxsize=4096, path=None):
+        self.maxsize = maxsize
+        self.memory = OrderedDict()
+        self.db = None
+        if path is not None:
+            self.db = sqlite3.connect(path)
+            self.db.execute("CREATE TABLE IF NOT EXISTS fitness (key TEXT PRIMARY KEY, fitness REAL)")
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return self.memory[key]
+        if self.db is not None:
+            row = self.db.execute("SELECT fitness FROM fitness WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self.remember(key, row[0])
+                self.hits += 1
+                return row[0]
+        self.misses += 1
+        return None
+
+    def remember(self, key, fitness):
+        self.memory[key] = fitness
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.maxsize:
+            self.memory.popitem(last=False)
+
+    def put_many(self, items):
+        for key, fitness in items:
+            self.remember(key, fitness)
+        if self.db is not None:
+            with self.db:
+                self.db.executemany("INSERT OR REPLACE INTO fitness VALUES (?, ?)", items)
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+
+# Wraps a population.run fitness function (evaluate_genomes, ParallelEvaluator.evaluate,
+# batch_sim.eval_genomes...) so only genomes missing from the cache reach it
+class CachedEvaluator:
+    def __init__(self, cache, evaluate, scenario):
+        self.cache = cache
+        self.evaluate_function = evaluate
+        self.scenario = scenario  # Identifies the traffic, fitness is only reused on the same traffic
+
+    def evaluate(self, genomes, config):
+        missing = []
+        for genome_id, genome in genomes:
+            key = genome_key(genome, self.scenario)
+            fitness = self.cache.get(key)
+            if fitness is None:
+                missing.append((key, (genome_id, genome)))
+            else:
+                genome.fitness = fitness
+        if missing:
+            self.evaluate_function([item for key, item in missing], config)
+            self.cache.put_many([(key, genome.fitness) for key, (genome_id, genome) in missing])
+
+
+# Prints cache hits and misses for each generation
+class CacheReporter(BaseReporter):
+    def __init__(self, cache):
+        self.cache = cache
+
+    def post_evaluate(self, config, population, species, best_genome):
+        print("Fitness cache: {0} hits, {1} misses".format(self.cache.hits, self.cache.misses))
+        self.cache.hits = 0
+        self.cache.misses = 0
@@ -0,0 +1,320 @@
+import random
+import argparse
+from collections import deque
+from time import perf_counter
+import numpy as np
+import neat
+
+from batch_net import BatchNetwork
+from simulation import TICK_MS, MISSING_CAR_PENALTY
+
+# Travel directions are indexes into DIRECTIONS: 0 = east-west (+x), 1 = west-east (-x),
+# 2 = north-south (+y), 3 = south-north (-y). A direction's road axis is d // 2.
+STEP = [(1, 0), (-1, 0), (0, 1), (0, -1)]  # (column, row) change per block
+TURNS = [(2, 3), (2, 3), (0, 1), (0, 1)]  # Directions a car can turn into, no U-turns
+SPEED = 6  # Distance per tick, as in IntersectionSim
+GAP = 50  # Distance kept to the car ahead, the same spacing as the single intersection's queues
+STOP_GAP = 50  # The stop line is this far before the end of a segment (half a road width)
+NO_LIMIT = np.iinfo(np.int64).max // 2
+
+
+# Grid of rows x cols intersections, block apart. Every intersection has a segment coming
+# in and one going out in each direction. Segments off the edge of the grid are entries
+# (cars appear at their start) and exits (cars finish at their end).
+class GridLayout:
+    def __init__(self, rows, cols, block=400):
+        self.rows = rows
+        self.cols = cols
+        self.block = block
+        self.num_nodes = rows * cols
+
+        # in_seg[node, d] = segment ending at node travelling in d, out_seg[node, d] the one leaving it
+        self.in_seg = np.zeros((self.num_nodes, 4), dtype=np.int64)
+        self.out_seg = np.zeros((self.num_nodes, 4), dtype=np.int64)
+        seg_end = []
+        seg_dir = []
+        self.entries = []
+        for node in range(self.num_nodes):
+            for d in range(4):
+                self.in_seg[node, d] = len(seg_end)
+                seg_end.append(node)
+                seg_dir.append(d)
+                if self.neighbor(node, d, -1) is None:
+                    self.entries.append(self.in_seg[node, d])
+        for node in range(self.num_nodes):
+            for d in range(4):
+                downstream = self.neighbor(node, d, 1)
+                if downstream is not None:
+                    self.out_seg[node, d] = self.in_seg[downstream, d]
+                else:
+                    self.out_seg[node, d] = len(seg_end)  # Exit segment
+                    seg_end.append(-1)
+                    seg_dir.append(d)
+        self.seg_end = np.array(seg_end)  # -1 for exits
+        self.seg_dir = np.array(seg_dir)
+        self.seg_axis = self.seg_dir // 2
+        self.num_segments = len(seg_end)
+        # Free-flow time of a straight trip across the grid, averaged over both axes.
+        # For a 1x1 grid with the default block this is the 4000 ms IntersectionSim uses.
+        self.trip_ms = ((cols + 1) + (rows + 1)) / 2 * block / SPEED * TICK_MS
+
+    def neighbor(self, node, d, sign):
+        # The intersection one block away in direction d (sign -1 = the one behind), None off the grid
+        row, col = divmod(node, self.cols)
+        dc, dr = STEP[d]
+        row, col = row + sign * dr, col + sign * dc
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return row * self.cols + col
+        return None
+
+
+# Random arrivals spread over the entry segments. Each entry gets a car every spawn_interval
+# milliseconds on average, with random (Poisson) gaps. Yields (time, entry index) forever.
+def grid_arrivals(num_entries, seed=None, spawn_interval=800):
+    rng = random.Random(seed)
+    time = 0.0
+    while True:
+        time += rng.expovariate(num_entries / spawn_interval)
+        yield time, rng.randrange(num_entries)
+
+
+# A road network of intersections, each with its own light run by a network: one shared by
+# every intersection, or a list with one per intersection. Cars live in flat arrays and
+# every segment keeps its cars as a linked queue (ahead/behind), so a car only looks at the
+# car in front of it and the light at the end of its segment. One tick is a few NumPy passes
+# over the cars and intersections plus a little Python for the cars changing segment.
+class GridSim:
+    def __init__(self, networks, rows=2, cols=2, seed=None, cars_to_finish=None, spawn_interval=800,
+                 turn_prob=0.2, block=400, capacity=256):
+        self.layout = layout = GridLayout(rows, cols, block)
+        if isinstance(networks, list):
+            self.batch_network = BatchNetwork(networks)
+        else:
+            self.batch_network = BatchNetwork([networks]).subset(np.zeros(layout.num_nodes, dtype=np.int64))
+        self.cars_to_finish = cars_to_finish if cars_to_finish is not None else 10 * layout.num_nodes
+        self.turn_prob = turn_prob
+        # Turns and arrivals get separate streams, one seed for both would correlate them
+        self.rng = random.Random(None if seed is None else '{0}:turns'.format(seed))
+        self.arrivals = grid_arrivals(len(layout.entries), seed, spawn_interval)
+        self.next_arrival = next(self.arrivals)
+        self.backlog = {}  # Entry segment -> deque of start times of cars waiting for room to enter
+        self.ticks = 0  # Milliseconds simulated
+
+        # Lights, same rules as TrafficLight: state 0 = east-west green, 1 = north-south green
+        self.light_state = np.zeros(layout.num_nodes, dtype=np.int64)
+        self.buffer_time = np.zeros(layout.num_nodes, dtype=np.int64)
+
+        # Segment queues: front and back car (-1 = empty) and totals for the network inputs
+        self.seg_head = np.full(layout.num_segments, -1, dtype=np.int64)
+        self.seg_tail = np.full(layout.num_segments, -1, dtype=np.int64)
+        self.seg_sum_start = np.zeros(layout.num_segments, dtype=np.int64)
+        self.seg_count = np.zeros(layout.num_segments, dtype=np.int64)
+
+        # Cars, indexed by slot. Slots of finished cars are reused.
+        self.pos = np.zeros(capacity, dtype=np.int64)  # Distance along the segment
+        self.seg = np.zeros(capacity, dtype=np.int64)
+        self.next_seg = np.zeros(capacity, dtype=np.int64)  # Where it goes at the end of seg, -1 = finishes
+        self.ahead = np.full(capacity, -1, dtype=np.int64)
+        self.behind = np.full(capacity, -1, dtype=np.int64)
+        self.start_time = np.zeros(capacity, dtype=np.int64)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.free = list(range(capacity - 1, -1, -1))
+
+        self.total_time = 0
+        self.cars_finished = 0
+        self.cars_spawned = 0
+
+    def _grow(self):
+        capacity = len(self.pos)
+        for name in ('pos', 'seg', 'next_seg', 'ahead', 'behind', 'start_time', 'active'):
+            old = getattr(self, name)
+            new = np.full(capacity * 2, -1 if name in ('ahead', 'behind') else 0, dtype=old.dtype)
+            new[:capacity] = old
+            setattr(self, name, new)
+        self.free.extend(range(capacity * 2 - 1, capacity - 1, -1))
+
+    def route(self, s):
+        # Pick the segment a car takes after s
+        node = self.layout.seg_end[s]
+        if node < 0:
+            return -1
+        d = self.layout.seg_dir[s]
+        if self.rng.random() < self.turn_prob:
+            d = self.rng.choice(TURNS[d])
+        return self.layout.out_seg[node, d]
+
+    def enter(self, car, s, pos):
+        # Put car at the back of segment s
+        tail = self.seg_tail[s]
+        self.pos[car] = pos
+        self.seg[car] = s
+        self.next_seg[car] = self.route(s)
+        self.ahead[car] = tail
+        self.behind[car] = -1
+        if tail >= 0:
+            self.behind[tail] = car
+        else:
+            self.seg_head[s] = car
+        self.seg_tail[s] = car
+        self.seg_sum_start[s] += self.start_time[car]
+        self.seg_count[s] += 1
+
+    def leave(self, car):
+        # Take car off the front of its segment
+        s = self.seg[car]
+        back = self.behind[car]
+        self.seg_head[s] = back
+        if back >= 0:
+            self.ahead[back] = -1
+        else:
+            self.seg_tail[s] = -1
+        self.seg_sum_start[s] -= self.start_time[car]
+        self.seg_count[s] -= 1
+
+    def has_room(self, s):
+        tail = self.seg_tail[s]
+        return tail < 0 or self.pos[tail] >= GAP
+
+    def spawn_car(self, s, start_time):
+        if not self.free:
+            self._grow()
+        car = self.free.pop()
+        self.start_time[car] = start_time
+        self.active[car] = True
+        self.enter(car, s, 0)
+        self.cars_spawned += 1
+
+    def get_inputs(self):
+        # Per intersection, like IntersectionSim.get_inputs: summed start times of the cars
+        # coming in on each road, and 1 when east-west is green
+        in_seg = self.layout.in_seg
+        inputs = np.zeros((self.layout.num_nodes, 3))
+        inputs[:, 0] = self.seg_sum_start[in_seg[:, 0]] + self.seg_sum_start[in_seg[:, 1]]
+        inputs[:, 1] = self.seg_sum_start[in_seg[:, 2]] + self.seg_sum_start[in_seg[:, 3]]
+        inputs[:, 2] = self.light_state == 0
+        return inputs
+
+    def step(self):
+        layout = self.layout
+
+        # Network decisions and light updates, as in BatchIntersectionSim.step
+        output = self.batch_network.activate(self.get_inputs())[:, 0]
+        change = ((output > 0.5) | (output < 0.00001)) & (self.buffer_time == 0)
+        self.buffer_time[change] = 2000
+        self.light_state[change] ^= 1
+        counting, overshot = self.buffer_time > 0, self.buffer_time < 0
+        self.buffer_time[counting] -= TICK_MS
+        self.buffer_time[overshot] = 0
+
+        # New cars, which wait off the grid while their entry is full
+        while self.next_arrival[0] <= self.ticks:
+            s = layout.entries[self.next_arrival[1]]
+            self.backlog.setdefault(s, deque()).append(self.ticks)
+            self.next_arrival = next(self.arrivals)
+        for s in list(self.backlog):
+            if self.has_room(s):
+                waiting = self.backlog[s]
+                self.spawn_car(s, waiting.popleft())
+                if not waiting:
+                    del self.backlog[s]
+
+        # Move every car as far as the car ahead, a red light and the next segment allow
+        cars = np.flatnonzero(self.active)
+        s = self.seg[cars]
+        old_pos = self.pos[cars]
+        ahead = self.ahead[cars]
+        limit = np.where(ahead >= 0, self.pos[ahead] - GAP, NO_LIMIT)
+        node = layout.seg_end[s]
+        stop_line = layout.block - STOP_GAP
+        red = (node >= 0) & (self.light_state[node] != layout.seg_axis[s]) & (old_pos <= stop_line)
+        limit = np.where(red, np.minimum(limit, stop_line), limit)
+        next_seg = self.next_seg[cars]
+        next_tail = np.where(next_seg >= 0, self.seg_tail[next_seg], -1)
+        blocked = (ahead < 0) & (next_tail >= 0)
+        limit = np.where(blocked, np.minimum(limit, layout.block + self.pos[next_tail] - GAP), limit)
+        pos = np.maximum(old_pos, np.minimum(old_pos + SPEED, limit))
+        self.pos[cars] = pos
+
+        # At most the front car of a segment gets to its end in one tick. Front cars of several
+        # segments can head for the same one, so they move on one at a time, furthest first,
+        # each keeping GAP behind whoever entered before it.
+        over = np.flatnonzero(pos >= layout.block)
+        over = over[np.argsort(-pos[over], kind='stable')]
+        for car, old in zip(cars[over].tolist(), old_pos[over].tolist()):
+            target = self.next_seg[car]
+            if target >= 0:
+                entry = self.pos[car] - layout.block
+                tail = self.seg_tail[target]
+                if tail >= 0:
+                    entry = min(entry, self.pos[tail] - GAP)
+                if entry < 0:
+                    self.pos[car] = max(old, layout.block + entry)  # No room yet, wait at the end
+                    continue
+                self.leave(car)
+                self.enter(car, target, entry)
+            else:
+                self.leave(car)
+                self.total_time += self.ticks - self.start_time[car]
+                self.cars_finished += 1
+                self.active[car] = False
+                self.free.append(car)
+        self.ticks += TICK_MS
+
+    def fitness(self):
+        return 1 / (self.total_time / (self.layout.trip_ms * self.cars_to_finish))
+
+    def partial_fitness(self):
+        # As IntersectionSim.partial_fitness, cars still waiting to enter count too
+        on_road = self.seg_count.sum() + sum(len(waiting) for waiting in self.backlog.values())
+        started = self.seg_sum_start.sum() + sum(sum(waiting) for waiting in self.backlog.values())
+        waited = on_road * self.ticks - started
+        missing = max(0, self.cars_to_finish - self.cars_finished)
+        return 1 / ((self.total_time + waited + missing * MISSING_CAR_PENALTY) /
+                    (self.layout.trip_ms * self.cars_to_finish))
+
+    def run(self, max_ticks=None, max_seconds=None):
+        # Budgets as in IntersectionSim.run
+        deadline = perf_counter() + max_seconds if max_seconds is not None else None
+        self.stopped = None
+        while self.cars_finished < self.cars_to_finish:
+            if max_ticks is not None and self.ticks // TICK_MS >= max_ticks:
+                self.stopped = 'ticks'
+            elif deadline is not None and perf_counter() > deadline:
+                self.stopped = 'time'
+            if self.stopped is not None:
+                return self.partial_fitness()
+            self.step()
+        return self.fitness()
+
+
+def eval_genome(genome, config, rows=2, cols=2, seed=None, max_ticks=None, cars_to_finish=None, max_seconds=None):
+    # One network shared by every intersection of the grid
+    network = neat.nn.FeedForwardNetwork.create(genome, config)
+    return GridSim(network, rows, cols, seed=seed, cars_to_finish=cars_to_finish).run(max_ticks, max_seconds)
+
+
+def scaling(config, sizes, ticks=200, seed=0):
+    # Time a random genome's network on square grids of each size
+    genome = config.genome_type(0)
+    genome.configure_new(config.genome_config)
+    network = neat.nn.FeedForwardNetwork.create(genome, config)
+    for size in sizes:
+        sim = GridSim(network, size, size, seed=seed, cars_to_finish=float('inf'))
+        for _ in range(ticks // 2):
+            sim.step()  # Fill the roads before timing
+        cars = int(sim.active.sum())
+        start = perf_counter()
+        for _ in range(ticks // 2):
+            sim.step()
+        elapsed = perf_counter() - start
+        print("{0:4d}x{0:<4d} {1:7d} cars {2:8.2f} ms/tick {3:7.2f} us/car-tick".format(
+            size, cars, elapsed / (ticks // 2) * 1000, elapsed / (ticks // 2) / max(cars, 1) * 1e6))
+
+
+if __name__ == '__main__':
+    import main
+    parser = argparse.ArgumentParser(description="Time GridSim on growing square grids")
+    parser.add_argument('--sizes', default='1,4,16,32,64')
+    parser.add_argument('--ticks', type=int, default=200)
+    args = parser.parse_args()
+    scaling(main.load_config(), [int(size) for size in args.sizes.split(',')], args.ticks)
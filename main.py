@@ -1,289 +1,269 @@
-import pygame
-import random
+import os
+import pickle
+import hashlib
 import neat
 
-# Initialize pygame
-pygame.init()
-
-# Set up display
-width, height = 800, 600
-screen = pygame.display.set_mode((width, height))
-pygame.display.set_caption("Traffic Intersection Simulation")
-
-# Colors
-WHITE = (255, 255, 255)
-RED = (255, 0, 0)
-GREEN = (0, 255, 0)
-YELLOW = (255, 255, 0)
-BLACK = (0, 0, 0)
-GRAY = (169, 169, 169)
-
-# Intersection stopping zones
-STOP_ZONE_X_E = width // 2 - 100
-STOP_ZONE_Y_W = height // 2 - 100
-STOP_ZONE_X_W = width // 2 + 100
-STOP_ZONE_Y_E = height // 2 + 100
-
-# Track Cars
-carsEW = 0
-carsWE = 0
-carsNS = 0
-carsSN = 0
-cars_finished = 0
-
-
-# Car class
-class Car:
-    def __init__(self, x, y, direction, start_time):
-        self.x = x
-        self.y = y
-        self.direction = direction
-        self.speed = 6
-        self.is_stopped = False
-        self.passed_intersection = False
-        self.start_time = start_time
-        if direction == 'east-west':
-            self.cars_at_time = carsEW
-        elif direction == 'west-east':
-            self.cars_at_time = carsWE
-        elif direction == 'north-south':
-            self.cars_at_time = carsNS
-        elif direction == 'south-north':
-            self.cars_at_time = carsSN
-
-    def move(self, traffic_light):
-        global carsEW, carsWE, carsNS, carsSN
-        # Stop condition for each direction
-        if self.direction == 'east-west':
-            near_intersection = STOP_ZONE_X_E - (self.cars_at_time * 50) + 50 <= self.x <= STOP_ZONE_X_E + 10
-            stop_for_red = traffic_light.state == 'north-south' or traffic_light.color == RED
-        elif self.direction == 'north-south':
-            near_intersection = STOP_ZONE_Y_W - (self.cars_at_time * 50) + 50 <= self.y <= STOP_ZONE_Y_W + 10
-            stop_for_red = traffic_light.state == 'east-west' or traffic_light.color == RED
-        elif self.direction == 'south-north':
-            near_intersection = STOP_ZONE_Y_E - 50 <= self.y <= STOP_ZONE_Y_E - 40 + (self.cars_at_time * 50) - 50
-            stop_for_red = traffic_light.state == 'east-west' or traffic_light.color == RED
-        elif self.direction == 'west-east':
-            near_intersection = STOP_ZONE_X_W - 50 <= self.x <= STOP_ZONE_X_W - 40 + (self.cars_at_time * 50) - 50
-            stop_for_red = traffic_light.state == 'north-south' or traffic_light.color == RED
-
-        # Stop or move logic
-        if near_intersection and stop_for_red:
-            self.is_stopped = True
-        else:
-            self.is_stopped = False
-
-        # Move if not stopped
-        if not self.is_stopped:
-            if self.direction == 'east-west':
-                self.x += self.speed
-            elif self.direction == 'west-east':
-                self.x -= self.speed
-            elif self.direction == 'north-south':
-                self.y += self.speed
-            elif self.direction == 'south-north':
-                self.y -= self.speed
-
-    def passedIntersection(self):
-        global carsEW, carsWE, carsNS, carsSN
-        if self.direction == 'east-west':
-            if not self.passed_intersection and self.x > width // 2:
-                carsEW -= 1
-                self.passed_intersection = True
-        elif self.direction == 'west-east':
-            if not self.passed_intersection and self.x < width // 2:
-                carsWE -= 1
-                self.passed_intersection = True
-        elif self.direction == 'north-south':
-            if not self.passed_intersection and self.y > height // 2:
-                carsNS -= 1
-                self.passed_intersection = True
-        elif self.direction == 'south-north':
-            if not self.passed_intersection and self.y < height // 2:
-                carsSN -= 1
-                self.passed_intersection = True
-        return self.passed_intersection
-
-    def draw(self):
-        if self.direction in ['east-west', 'west-east']:
-            pygame.draw.rect(screen, BLACK, (self.x, self.y, 40, 20))  # Horizontal car
-        else:
-            pygame.draw.rect(screen, BLACK, (self.x, self.y, 20, 40))  # Vertical car
-
-    def get_final_time(self, current_time):
-        return current_time - self.start_time
-
-    def get_start_time(self):
-        return self.start_time
-
-
-# Traffic light class
-class TrafficLight:
-    def __init__(self):
-        self.state = 'east-west'  # 'east-west' or 'north-south'
-        self.color = GREEN
-        self.buffer_time = 0  # Buffer time for delay after light change
-
-    def change(self):
-        global carsEW, carsWE, carsNS, carsSN
-        # Switch between directions and apply buffer time
-        if self.buffer_time == 0:  # Only change if there's no active buffer
-            self.buffer_time = 2000  # 2 second buffer time
-            if self.state == 'east-west':
-                self.state = 'north-south'
-                self.color = GREEN
-            else:
-                self.state = 'east-west'
-                self.color = GREEN  # Ensure green for the switched state
-
-    def update(self):
-        # Decrease buffer time and stop cars from moving during this time
-        if self.buffer_time > 0:
-            self.buffer_time -= 30  # Decrease by 30 milliseconds (based on pygame.time.delay)
-        elif self.buffer_time < 0:
-            self.buffer_time = 0
-
-    def draw(self):
-        # Set light color based on buffer_time
-        if self.buffer_time > 0:
-            light_color = YELLOW  # Show yellow light when buffer_time is not zero
-        else:
-            light_color = GREEN if self.state == 'north-south' else RED
-        pygame.draw.rect(screen, BLACK, (width // 2 - 25, height // 2 - 25, 50, 50))
-        pygame.draw.circle(screen, light_color, (width // 2, height // 2), 20)
+# Worker processes import this module, so only what eval_genome needs for the tick and event
+# engines is imported here. pygame and the NumPy-based modules are imported where they're used.
+from fitness_cache import FitnessCache, CachedEvaluator, CacheReporter
+from distributed import Coordinator, load_authkey, parse_address, start_local_workers
+from steady_state import SteadyStatePopulation
+from profiling import PhaseProfiler, ProfileReporter
+from event_sim import EventIntersectionSim
+from simulation import IntersectionSim, WallClock, width, height, WHITE
+
+# Headless mode runs on a simulated clock: no window, no drawing and no delay
+# Set TRAFFIC_HEADLESS=1 to train as fast as the CPU allows
+HEADLESS = os.environ.get('TRAFFIC_HEADLESS', '0') == '1'
+# Seed for car spawning, the same seed gives the same fitness in headless mode
+SEED = os.environ.get('TRAFFIC_SEED')
+SEED = int(SEED) if SEED is not None else None
+# Headless engine: 'tick' runs one IntersectionSim per genome, 'event' jumps between
+# arrivals, exits and light changes instead of stepping every frame, 'batch' runs the
+# whole generation in lockstep with NumPy (every genome then sees the same traffic),
+# 'grid' runs a grid of intersections that all share the genome's network
+ENGINE = os.environ.get('TRAFFIC_ENGINE', 'tick')
+GRID = [int(n) for n in os.environ.get('TRAFFIC_GRID', '2x2').split('x')]  # Rows x columns for the grid engine
+# Arrivals file from scenarios.py, shared by every genome instead of random traffic
+SCENARIO = os.environ.get('TRAFFIC_SCENARIO')
+# Cached fitness is reused when the traffic is fixed (TRAFFIC_SEED or TRAFFIC_SCENARIO)
+CACHE_SIZE = int(os.environ.get('TRAFFIC_CACHE_SIZE', 4096))  # 0 turns the cache off
+CACHE_DB = os.environ.get('TRAFFIC_CACHE_DB')  # SQLite file that keeps cached fitness between runs
+# Per-phase timings of the tick engine, written each generation to this CSV (or .json) file.
+# Evaluation then stays in this process so the timings can be collected, which rules out the
+# other headless engines, racing, the coordinator and steady state.
+PROFILE = os.environ.get('TRAFFIC_PROFILE')
+profiler = PhaseProfiler() if PROFILE else None
+# Evaluation budgets: a genome still running after this many frames or seconds is stopped
+# and scored on what it managed, with a penalty for every car it didn't finish
+MAX_TICKS = int(os.environ.get('TRAFFIC_MAX_TICKS', 20000))  # 0 = no limit
+MAX_SECONDS = os.environ.get('TRAFFIC_MAX_SECONDS')
+MAX_SECONDS = float(MAX_SECONDS) if MAX_SECONDS is not None else None
+CARS_TO_FINISH = 10  # Cars a genome is scored on, per intersection on the grid
+# Stop a genome as soon as it can't beat the best one already evaluated this generation.
+# Only the serial and batch evaluators know that, and the fitness cache is turned off.
+EARLY_ABORT = os.environ.get('TRAFFIC_EARLY_ABORT', '0') == '1'
+# Race genomes across several scenarios (successive halving) instead of one episode each.
+# A directory of .arrivals files or a number of random seeds. Overrides SEED and SCENARIO.
+RACE = os.environ.get('TRAFFIC_RACE')
+RACE_FIRST = int(os.environ.get('TRAFFIC_RACE_FIRST', 2))  # Scenarios every genome runs
+RACE_KEEP = float(os.environ.get('TRAFFIC_RACE_KEEP', 0.5))  # Fraction that moves on to each next rung
+# Directory to write a replay of each generation's best genome to, for replay.py. Replays are
+# of the single intersection, so nothing is recorded with the grid engine.
+RECORD = os.environ.get('TRAFFIC_RECORD')
+# Serve genomes to worker processes over TCP at this host:port instead of evaluating them
+# here. Workers connect with `python distributed.py host:port --processes N`, and
+# TRAFFIC_LOCAL_WORKERS starts that many on this machine too. Other hosts need the shared
+# secret in TRAFFIC_AUTHKEY on both ends, without it the coordinator only listens on loopback.
+COORDINATOR = os.environ.get('TRAFFIC_COORDINATOR')
+LOCAL_WORKERS = int(os.environ.get('TRAFFIC_LOCAL_WORKERS', 0))
+BATCH_SIZE = int(os.environ.get('TRAFFIC_BATCH_SIZE', 4))  # Genomes per message to a worker
+# Steady-state evolution: no generation barrier, a new child goes to each worker as soon as
+# it finishes. Generations then count pop_size evaluations. Uses the tick or event engine.
+STEADY_STATE = os.environ.get('TRAFFIC_STEADY_STATE', '0') == '1'
+# Only simulate this fraction of each generation, the genomes a cheap queue model of the
+# intersection ranks best. Every TRAFFIC_SURROGATE_AUDIT generations all genomes are
+# simulated to check the model's rank correlation with the simulation.
+SURROGATE = os.environ.get('TRAFFIC_SURROGATE')
+SURROGATE = float(SURROGATE) if SURROGATE is not None else None
+SURROGATE_AUDIT = int(os.environ.get('TRAFFIC_SURROGATE_AUDIT', 5))
+# Write the winner as a standalone controller module to this path (and the genome, pickled,
+# next to it), then check it against the network and time it
+EXPORT = os.environ.get('TRAFFIC_EXPORT')
+# Worker processes for headless evaluation
+WORKERS = int(os.environ.get('TRAFFIC_WORKERS', os.cpu_count() or 1))
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config-feedforward")
+
+screen = None
+font = None
+
+
+def init_display():
+    global screen
+    import pygame
+    # Initialize pygame and set up display
+    pygame.init()
+    screen = pygame.display.set_mode((width, height))
+    pygame.display.set_caption("Traffic Intersection Simulation")
 
 
 # Draw button
 def draw_button():
+    global font
+    import pygame
     pygame.draw.rect(screen, (0, 128, 255), (width - 150, height - 50, 120, 30))  # Button
-    font = pygame.font.SysFont('Arial', 20)
+    if font is None:
+        font = pygame.font.SysFont('Arial', 20)
     text = font.render('Change Light', True, WHITE)
     screen.blit(text, (width - 140, height - 45))
 
 
-# Game loop
-traffic_light = TrafficLight()
-cars = []
-total_time = 0
-
-
-def delete_car(car_to_remove, time):
-    global total_time, cars_finished
-    if car_to_remove.x > 830 or car_to_remove.x < -30 or car_to_remove.y > 630 or car_to_remove.y < -30:
-        total_time += car_to_remove.get_final_time(time)
-        cars_finished += 1
-        cars.remove(car_to_remove)
-        return True
-    return False
+def get_arrivals():
+    # Traffic from the scenario file if one is set, otherwise None for random traffic from SEED
+    if SCENARIO is None:
+        return None
+    import scenarios
+    return scenarios.iter_arrivals(scenarios.load_scenario(SCENARIO))
+
+
+def traffic_id():
+    # Names the traffic genomes are evaluated on, None when it is random. The engine, grid size,
+    # budget and car count are part of it, they change fitness on the same traffic.
+    setup = '{0}:{1}x{2}:ticks:{3}:cars:{4}'.format(ENGINE, GRID[0], GRID[1], MAX_TICKS, CARS_TO_FINISH)
+    if SCENARIO is not None and ENGINE != 'grid':
+        with open(SCENARIO, 'rb') as f:
+            return setup + ':scenario:' + hashlib.sha1(f.read()).hexdigest()
+    if SEED is not None:
+        return setup + ':seed:{0}'.format(SEED)
+    return None
+
+
+def evaluation_settings():
+    # Everything eval_genome's fitness depends on besides the genome. Distributed workers
+    # refuse to evaluate when theirs differ from the coordinator's.
+    return {'engine': ENGINE, 'grid': GRID, 'seed': SEED, 'traffic': traffic_id(), 'max_ticks': MAX_TICKS,
+            'max_seconds': MAX_SECONDS, 'cars_to_finish': CARS_TO_FINISH}
+
+
+def eval_genome(genome, config, abort_below=None):
+    # Headless evaluation of one genome, safe to call from worker processes
+    if ENGINE == 'grid':
+        import grid_sim
+        return grid_sim.eval_genome(genome, config, GRID[0], GRID[1], SEED, MAX_TICKS or None,
+                                    CARS_TO_FINISH * GRID[0] * GRID[1], MAX_SECONDS)
+    network = neat.nn.FeedForwardNetwork.create(genome, config)
+    if ENGINE == 'event':
+        sim = EventIntersectionSim(network, seed=SEED, cars_to_finish=CARS_TO_FINISH, arrivals=get_arrivals())
+    else:
+        sim = IntersectionSim(network, seed=SEED, cars_to_finish=CARS_TO_FINISH, arrivals=get_arrivals(),
+                              profiler=profiler)
+    return sim.run(MAX_TICKS or None, MAX_SECONDS, abort_below)
 
 
 def evaluate_genomes(genomes, config):
-    global cars_finished, carsEW, carsWE, carsNS, carsSN, total_time, cars, traffic_light
-
-    # Create neural networks for each genome
+    # Evaluate each genome in turn, drawing to the window unless running headless
+    best = None
     for genome_id, genome in genomes:
-        total_time, carsEW, carsWE, carsNS, carsSN = 0, 0, 0, 0, 0
-        cars_finished = 0
-        last_car_time = pygame.time.get_ticks()
-        random_time_interval = 0
-        traffic_light = TrafficLight()
-        cars = []
-
-        network = neat.nn.FeedForwardNetwork.create(genome, config)
-
-        while cars_finished < 10:  # Continue until 20 cars have passed the intersection
-            screen.fill(WHITE)  # Clear the screen for each frame
-
-            pygame.draw.rect(screen, GRAY, (0, height // 2 - 50, width, 100))  # horizontal road
-            pygame.draw.rect(screen, GRAY, (width // 2 - 50, 0, 100, height))  # vertical road
-
-            # Get the current state for the network input
-            cars_waiting_ew = 0
-            cars_waiting_ns = 0
-            for car in cars:
-                if car.direction == 'east-west' or 'west-east':
-                    cars_waiting_ew += car.get_start_time()
-                else:  # 'south-north' / 'north-south'
-                    cars_waiting_ns += car.get_start_time()
-
-            if traffic_light.state == 'east-west' or traffic_light.state == 'west-east':
-                light_state = 1  # green
-            else:
-                light_state = 0 # red
-
-            # Prepare the input for the neural network
-            inputs = [float(cars_waiting_ew), float(cars_waiting_ns), light_state]
-
-            # Get the network decision
-            output = network.activate(inputs)
-            if output[0] > 0.5 or output[0] < 0.00001: # If the output is greater than 0.5, change the light
-                traffic_light.change()
-
-            # Update and draw the traffic light
-            traffic_light.update()
-            traffic_light.draw()
-
-            current_time = pygame.time.get_ticks()
-            if current_time - last_car_time >= random_time_interval:
-                random_time_interval = random.randint(800, 800)
-                direction = random.choice(['east-west', 'west-east', 'north-south', 'south-north'])
-                if direction == 'east-west':
-                    carsEW += 1
-                    x = 0  # Starting from left
-                    y = 315
-                elif direction == 'west-east':
-                    carsWE += 1
-                    x = width  # Starting from right
-                    y = 270
-                elif direction == 'north-south':
-                    carsNS += 1
-                    x = 370
-                    y = 0  # Starting from top
-                else:  # 'south-north'
-                    carsSN += 1
-                    x = 415
-                    y = height  # Starting from bottom
-
-                cars.append(Car(x, y, direction, pygame.time.get_ticks()))
-                last_car_time = current_time  # Update the last car generation time
-
-            # Move cars and check if they passed the intersection
-            for car in cars:
-                if not delete_car(car, pygame.time.get_ticks()):
-                    car.passedIntersection()
-                    car.move(traffic_light)
-                    car.draw()
-
-            # Update the screen and limit FPS using delay
-            pygame.display.update()
-            pygame.time.delay(30)
-
-        for car in cars:
-            cars.remove(car)
-        fitness_value = 1 / (total_time / (4000 * 10)) #4000 <- time for car to pass without stopping on average
-        genome.fitness = fitness_value
-
-
-# Set up the NEAT configuration
-config_file = "config-feedforward"  # Path to your config file
-config = neat.config.Config(neat.DefaultGenome, neat.DefaultReproduction,
-                            neat.DefaultSpeciesSet, neat.DefaultStagnation,
-                            config_file)
-
-# Initialize the population
-population = neat.Population(config)
-
-# Set the initial fitness of all genomes to 0
-for genome_id, genome in population.population.items():
-    genome.fitness = 0  # Set fitness to 0 for all genomes
-
-# Add a reporter to show the progress of evolution
-population.add_reporter(neat.StdOutReporter(True))
-population.add_reporter(neat.StatisticsReporter())
-
-# Run the NEAT algorithm
-population.run(evaluate_genomes, 5)  # Run for 5 generations
-pygame.quit()
+        if HEADLESS:
+            genome.fitness = eval_genome(genome, config, best if EARLY_ABORT else None)
+        else:
+            network = neat.nn.FeedForwardNetwork.create(genome, config)
+            sim = IntersectionSim(network, seed=SEED, clock=WallClock(), screen=screen, cars_to_finish=CARS_TO_FINISH,
+                                  arrivals=get_arrivals(), profiler=profiler)
+            genome.fitness = sim.run(MAX_TICKS or None, MAX_SECONDS)
+        if best is None or genome.fitness > best:
+            best = genome.fitness
+
+
+def load_config(config_file=CONFIG_FILE):
+    # Set up the NEAT configuration
+    return neat.config.Config(neat.DefaultGenome, neat.DefaultReproduction,
+                              neat.DefaultSpeciesSet, neat.DefaultStagnation,
+                              config_file)
+
+
+def run(generations=5):
+    config = load_config()
+    if profiler is not None and HEADLESS and (ENGINE != 'tick' or RACE is not None or COORDINATOR is not None
+                                              or STEADY_STATE):
+        raise ValueError("TRAFFIC_PROFILE times the tick engine in this process, it can't be used with "
+                         "TRAFFIC_ENGINE={0}, TRAFFIC_RACE, TRAFFIC_COORDINATOR or TRAFFIC_STEADY_STATE".format(ENGINE))
+    if HEADLESS and ENGINE == 'grid' and SCENARIO is not None:
+        raise ValueError("TRAFFIC_SCENARIO files are for a single intersection, the grid engine can't use them")
+    if HEADLESS and ENGINE == 'grid' and EARLY_ABORT:
+        raise ValueError("TRAFFIC_EARLY_ABORT isn't supported by the grid engine")
+    if HEADLESS and ENGINE == 'grid' and RACE is not None:
+        raise ValueError("TRAFFIC_RACE scenarios are for a single intersection, the grid engine can't use them")
+    if EXPORT is not None:
+        # Found out now rather than after training, when the winner would be lost
+        os.makedirs(os.path.dirname(os.path.abspath(EXPORT)), exist_ok=True)
+
+    # Initialize the population
+    steady_state = HEADLESS and STEADY_STATE
+    population = SteadyStatePopulation(config, WORKERS) if steady_state else neat.Population(config)
+
+    # Set the initial fitness of all genomes to 0
+    for genome_id, genome in population.population.items():
+        genome.fitness = 0  # Set fitness to 0 for all genomes
+
+    # Add a reporter to show the progress of evolution
+    population.add_reporter(neat.StdOutReporter(True))
+    population.add_reporter(neat.StatisticsReporter())
+    if profiler is not None:
+        population.add_reporter(ProfileReporter(profiler, PROFILE))
+    if RECORD is not None and HEADLESS and ENGINE == 'grid':
+        print("TRAFFIC_RECORD ignored: replays show a single intersection, not the grid")
+    elif RECORD is not None:
+        from recording import ReplayReporter
+        population.add_reporter(ReplayReporter(RECORD, SEED, get_arrivals if SCENARIO is not None else None,
+                                               MAX_TICKS or None))
+
+    # Run the NEAT algorithm, spreading headless evaluations across worker processes
+    coordinator = None
+    racing = None
+    if steady_state:
+        evaluate = eval_genome  # Per genome, SteadyStatePopulation hands genomes to its own workers
+    elif HEADLESS and RACE is not None:
+        from racing import RacingEvaluator, RacingReporter, scenario_list
+        racing = RacingEvaluator(scenario_list(RACE), RACE_FIRST, RACE_KEEP, ENGINE, MAX_TICKS or None, WORKERS)
+        population.add_reporter(RacingReporter(racing))
+        evaluate = racing.evaluate
+    elif HEADLESS and ENGINE == 'batch':
+        import batch_sim
+        evaluate = lambda genomes, config: batch_sim.eval_genomes(genomes, config, SEED, get_arrivals(), MAX_TICKS or None,
+                                                                  MAX_SECONDS, EARLY_ABORT, CARS_TO_FINISH)
+    elif HEADLESS and COORDINATOR is not None:
+        coordinator = Coordinator(parse_address(COORDINATOR), load_authkey(), batch_size=BATCH_SIZE,
+                                  settings=evaluation_settings())
+        start_local_workers(coordinator.address, LOCAL_WORKERS, coordinator.authkey)
+        evaluate = coordinator.evaluate
+    elif HEADLESS and WORKERS > 1 and profiler is None and not EARLY_ABORT:
+        evaluate = neat.ParallelEvaluator(WORKERS, eval_genome).evaluate
+    else:
+        evaluate = evaluate_genomes
+
+    # Skip genomes that were already evaluated on the same traffic. Aborted and raced genomes'
+    # fitness depends on the rest of their generation, and a wall-clock budget cuts genomes off
+    # at a different point every run, so none of those are cached.
+    traffic = traffic_id()
+    if (HEADLESS and CACHE_SIZE > 0 and traffic is not None and not EARLY_ABORT and RACE is None and not steady_state
+            and MAX_SECONDS is None):
+        cache = FitnessCache(CACHE_SIZE, CACHE_DB)
+        population.add_reporter(CacheReporter(cache))
+        evaluate = CachedEvaluator(cache, evaluate, traffic).evaluate
+
+    # Screen genomes with the surrogate first, it models the single intersection only
+    if HEADLESS and SURROGATE is not None and not steady_state and RACE is None and ENGINE != 'grid':
+        from surrogate import SurrogateEvaluator, SurrogateReporter
+        surrogate = SurrogateEvaluator(evaluate, SURROGATE, SURROGATE_AUDIT, SEED,
+                                       get_arrivals if SCENARIO is not None else None)
+        population.add_reporter(SurrogateReporter(surrogate))
+        evaluate = surrogate.evaluate
+
+    if not HEADLESS:
+        init_display()
+    try:
+        winner = population.run(evaluate, generations)
+    finally:
+        if coordinator is not None:
+            coordinator.stop()
+        if racing is not None:
+            racing.close()
+    if not HEADLESS:
+        import pygame
+        pygame.quit()
+    if EXPORT is not None:
+        from export import export_controller, load_controller, report
+        with open(os.path.splitext(EXPORT)[0] + '.pkl', 'wb') as f:
+            pickle.dump(winner, f)
+        if not report(export_controller(winner, config, EXPORT), load_controller(EXPORT)):
+            raise RuntimeError("the controller exported to {0} doesn't match the network, the genome is "
+                               "pickled next to it".format(EXPORT))
+    return winner
+
+if __name__ == '__main__':
+    run(5)  # Run for 5 generations
 
 
 # THIS CODE IS FOR NON-NEAT TO SEE IF IT WORKED WHICH IT DOES
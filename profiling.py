@@ -0,0 +1,88 @@
+import csv
+import json
+import time
+from collections import defaultdict
+
+from neat.reporting import BaseReporter
+
+# Phases of IntersectionSim.step, in the order they run
+PHASES = ('inputs', 'activate', 'light', 'spawn', 'move', 'delete', 'draw', 'display')
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+# Collects how long each phase of a tick takes, plus per-genome counters.
+# IntersectionSim calls start() at the top of a tick and lap(phase) after each phase.
+class PhaseProfiler:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.samples = defaultdict(list)  # Seconds per call, by phase
+        self.genomes = 0
+        self.ticks = 0
+        self.cars_spawned = 0
+        self.cars_finished = 0
+        self.last = 0.0
+
+    def start(self):
+        self.last = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.samples[phase].append(now - self.last)
+        self.last = now
+
+    def genome_done(self, ticks, cars_spawned, cars_finished):
+        self.genomes += 1
+        self.ticks += ticks
+        self.cars_spawned += cars_spawned
+        self.cars_finished += cars_finished
+
+    def summary(self):
+        rows = []
+        for phase in PHASES:
+            samples = self.samples.get(phase)
+            if samples:
+                rows.append({'phase': phase, 'calls': len(samples), 'total_ms': sum(samples) * 1000,
+                             'p50_us': percentile(samples, 0.5) * 1e6, 'p95_us': percentile(samples, 0.95) * 1e6})
+        return rows
+
+
+# Writes the profiler's numbers once per generation and starts it over. Files ending in
+# .json get a list of generations, anything else gets CSV with one row per phase.
+class ProfileReporter(BaseReporter):
+    def __init__(self, profiler, path):
+        self.profiler = profiler
+        self.path = path
+        self.generation = None
+        self.generations = []
+        if not path.endswith('.json'):
+            with open(path, 'w', newline='') as f:
+                csv.writer(f).writerow(['generation', 'phase', 'calls', 'total_ms', 'p50_us', 'p95_us', 'genomes',
+                                        'ticks_per_genome', 'cars_spawned', 'cars_finished'])
+
+    def start_generation(self, generation):
+        self.generation = generation
+        self.profiler.reset()
+
+    def post_evaluate(self, config, population, species, best_genome):
+        profiler = self.profiler
+        ticks_per_genome = profiler.ticks / profiler.genomes if profiler.genomes else 0
+        phases = profiler.summary()
+        if self.path.endswith('.json'):
+            self.generations.append({'generation': self.generation, 'genomes': profiler.genomes,
+                                     'ticks_per_genome': ticks_per_genome, 'cars_spawned': profiler.cars_spawned,
+                                     'cars_finished': profiler.cars_finished, 'phases': phases})
+            with open(self.path, 'w') as f:
+                json.dump(self.generations, f, indent=2)
+        else:
+            with open(self.path, 'a', newline='') as f:
+                writer = csv.writer(f)
+                for row in phases:
+                    writer.writerow([self.generation, row['phase'], row['calls'], round(row['total_ms'], 3),
+                                     round(row['p50_us'], 2), round(row['p95_us'], 2), profiler.genomes,
+                                     round(ticks_per_genome, 1), profiler.cars_spawned, profiler.cars_finished])
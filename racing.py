@@ -0,0 +1,128 @@
+import os
+from multiprocessing import Pool
+import neat
+from neat.reporting import BaseReporter
+
+import batch_sim
+import scenarios
+from event_sim import EventIntersectionSim
+from simulation import IntersectionSim
+
+
+def scenario_list(spec):
+    # TRAFFIC_RACE value to scenarios: a directory of .arrivals files from scenarios.py,
+    # or a number of seeds for random traffic
+    if os.path.isdir(spec):
+        return sorted(os.path.join(spec, name) for name in os.listdir(spec) if name.endswith('.arrivals'))
+    return list(range(int(spec)))
+
+
+def scenario_traffic(scenario):
+    # (seed, arrivals) for the simulators. Scenarios are arrival file paths or seeds.
+    if isinstance(scenario, str):
+        return None, scenarios.iter_arrivals(scenarios.load_scenario(scenario))
+    return scenario, None
+
+
+def evaluate_on(genome, config, scenario, engine='tick', max_ticks=None):
+    # Fitness of one genome on one scenario, safe to call from worker processes
+    network = neat.nn.FeedForwardNetwork.create(genome, config)
+    seed, arrivals = scenario_traffic(scenario)
+    if engine == 'event':
+        return EventIntersectionSim(network, seed=seed, arrivals=arrivals).run(max_ticks)
+    return IntersectionSim(network, seed=seed, arrivals=arrivals).run(max_ticks)
+
+
+# Successive halving over scenarios. Every genome runs the first `first` scenarios, then
+# only the best `keep` fraction goes on to the next rung, which has twice as many new
+# scenarios, and so on until the scenarios run out or one genome is left. Fitness is the
+# mean over the scenarios a genome ran, capped so a genome dropped at a rung never
+# ranks above one that went further.
+class RacingEvaluator:
+    def __init__(self, scenarios, first=2, keep=0.5, engine='tick', max_ticks=None, workers=1):
+        if not scenarios:
+            raise ValueError("racing needs at least one scenario")
+        if first < 1:
+            raise ValueError("the first rung needs at least one scenario, got first={0}".format(first))
+        if engine not in ('tick', 'event', 'batch'):
+            raise ValueError("racing runs single intersections, it can't use the {0} engine".format(engine))
+        self.scenarios = scenarios
+        self.first = first
+        self.keep = keep
+        self.engine = engine
+        self.max_ticks = max_ticks
+        self.pool = Pool(workers) if workers > 1 and engine != 'batch' else None
+        self.episodes = 0  # Genome-scenario runs since the reporter last looked
+        self.full_episodes = 0  # Runs it would have taken to put every genome on every scenario
+
+    def close(self):
+        # Shut the worker pool down, call once training is done
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def run_rung(self, genomes, config, rung_scenarios):
+        # Fitness of each genome on each scenario, as one list per genome
+        if self.engine == 'batch':
+            networks = [neat.nn.FeedForwardNetwork.create(genome, config) for genome in genomes]
+            per_scenario = []
+            for scenario in rung_scenarios:
+                seed, arrivals = scenario_traffic(scenario)
+                sim = batch_sim.BatchIntersectionSim(networks, seed=seed, arrivals=arrivals)
+                per_scenario.append([float(fitness) for fitness in sim.run(self.max_ticks)])
+            return [list(results) for results in zip(*per_scenario)]
+
+        jobs = [(genome, config, scenario, self.engine, self.max_ticks)
+                for genome in genomes for scenario in rung_scenarios]
+        if self.pool is not None:
+            results = self.pool.starmap(evaluate_on, jobs)
+        else:
+            results = [evaluate_on(*job) for job in jobs]
+        n = len(rung_scenarios)
+        return [results[i * n:(i + 1) * n] for i in range(len(genomes))]
+
+    def evaluate(self, genomes, config):
+        scores = {genome_id: [] for genome_id, genome in genomes}
+        contenders = list(genomes)
+        dropped = []  # Genomes dropped at each rung
+        used = 0
+        size = self.first
+        self.full_episodes += len(genomes) * len(self.scenarios)
+        while True:
+            rung_scenarios = self.scenarios[used:used + size]
+            results = self.run_rung([genome for genome_id, genome in contenders], config, rung_scenarios)
+            self.episodes += len(contenders) * len(rung_scenarios)
+            for (genome_id, genome), fitnesses in zip(contenders, results):
+                scores[genome_id].extend(fitnesses)
+                genome.fitness = sum(scores[genome_id]) / len(scores[genome_id])
+            used += len(rung_scenarios)
+            if used >= len(self.scenarios) or len(contenders) <= 1:
+                break
+
+            contenders.sort(key=lambda item: item[1].fitness, reverse=True)
+            survivors = max(1, int(len(contenders) * self.keep))
+            dropped.append(contenders[survivors:])
+            contenders = contenders[:survivors]
+            size *= 2
+
+        # Working back from the last rung, nobody dropped at a rung ends up above
+        # the worst genome that got past it
+        floor = min(genome.fitness for genome_id, genome in contenders)
+        for rung in reversed(dropped):
+            for genome_id, genome in rung:
+                genome.fitness = min(genome.fitness, floor)
+            if rung:
+                floor = min(floor, min(genome.fitness for genome_id, genome in rung))
+
+
+# Prints how many simulations racing ran compared to evaluating everything on every scenario
+class RacingReporter(BaseReporter):
+    def __init__(self, evaluator):
+        self.evaluator = evaluator
+
+    def post_evaluate(self, config, population, species, best_genome):
+        evaluator = self.evaluator
+        print("Racing: {0} of {1} scenario runs".format(evaluator.episodes, evaluator.full_episodes))
+        evaluator.episodes = 0
+        evaluator.full_episodes = 0
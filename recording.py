@@ -0,0 +1,65 @@
+import os
+import numpy as np
+import neat
+from neat.reporting import BaseReporter
+
+from simulation import IntersectionSim
+
+# Columns of a replay file. Per frame: simulated time, light state (0 = east-west green,
+# 1 = north-south green), light buffer and where the frame's cars start in the car columns.
+# Per car per frame: position and index into DIRECTIONS.
+FRAME_COLUMNS = {'time': '<u4', 'light': 'u1', 'buffer': '<i2', 'offset': '<u4'}
+CAR_COLUMNS = {'x': '<i2', 'y': '<i2', 'dir': 'u1'}
+
+
+# Collects what IntersectionSim looks like after every frame. Only plain numbers are kept,
+# so a viewer can redraw the run without the network or the simulator.
+class StateRecorder:
+    def __init__(self):
+        self.columns = {name: [] for name in list(FRAME_COLUMNS) + list(CAR_COLUMNS)}
+
+    def record(self, sim):
+        columns = self.columns
+        light = sim.traffic_light
+        columns['time'].append(sim.clock.get_ticks() - sim.start_ticks)
+        columns['light'].append(0 if light.state == 'east-west' else 1)
+        columns['buffer'].append(light.buffer_time)
+        columns['offset'].append(len(columns['x']))
+        for car in sim.cars():
+            columns['x'].append(car.x)
+            columns['y'].append(car.y)
+            columns['dir'].append(car.dir)
+
+    def save(self, path, **info):
+        # One uncompressed .npz with a typed array per column, plus anything in info
+        arrays = {name: np.array(self.columns[name], dtype=dtype)
+                  for name, dtype in list(FRAME_COLUMNS.items()) + list(CAR_COLUMNS.items())}
+        arrays.update({name: np.array(value) for name, value in info.items()})
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(path + '.tmp', path)  # A viewer following the directory never sees half a file
+
+
+# Re-runs the best genome of every generation with a StateRecorder and writes it to
+# directory/gen-<generation>.npz for replay.py. The episode uses the same traffic as
+# training when that is fixed by a seed or scenario.
+class ReplayReporter(BaseReporter):
+    def __init__(self, directory, seed=None, get_arrivals=None, max_ticks=None):
+        self.directory = directory
+        self.seed = seed
+        self.get_arrivals = get_arrivals  # Called for fresh arrivals each episode, None for random traffic
+        self.max_ticks = max_ticks
+        self.generation = None
+        os.makedirs(directory, exist_ok=True)
+
+    def start_generation(self, generation):
+        self.generation = generation
+
+    def post_evaluate(self, config, population, species, best_genome):
+        network = neat.nn.FeedForwardNetwork.create(best_genome, config)
+        arrivals = self.get_arrivals() if self.get_arrivals is not None else None
+        recorder = StateRecorder()
+        sim = IntersectionSim(network, seed=self.seed, arrivals=arrivals, recorder=recorder)
+        fitness = sim.run(self.max_ticks)
+        path = os.path.join(self.directory, "gen-{0:04d}.npz".format(self.generation))
+        recorder.save(path, generation=self.generation, genome=best_genome.key, fitness=fitness)
@@ -0,0 +1,117 @@
+import os
+import time
+import argparse
+import numpy as np
+import pygame
+
+from simulation import TrafficLight, HORIZONTAL, TICK_MS, width, height, WHITE, GRAY, BLACK
+
+LIGHT_RECT = (width // 2 - 25, height // 2 - 25, 50, 50)
+CAPTION_RECT = (10, 10, 360, 30)
+
+
+def load_replay(path):
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+def newest_replay(directory):
+    names = sorted(name for name in os.listdir(directory) if name.endswith('.npz'))
+    return os.path.join(directory, names[-1]) if names else None
+
+
+# Plays replay files written by recording.StateRecorder. The roads are drawn once, and each
+# frame only the areas that changed (old and new cars, the light, the caption) are redrawn
+# and sent to the display.
+class ReplayViewer:
+    def __init__(self, screen):
+        self.screen = screen
+        self.font = pygame.font.SysFont('Arial', 20)
+        self.background = pygame.Surface((width, height))
+        self.background.fill(WHITE)
+        pygame.draw.rect(self.background, GRAY, (0, height // 2 - 50, width, 100))  # horizontal road
+        pygame.draw.rect(self.background, GRAY, (width // 2 - 50, 0, 100, height))  # vertical road
+        self.light = TrafficLight()
+        self.car_rects = []  # Where cars were drawn last frame
+        self.last_light = None
+        self.caption = None
+
+    def start(self, replay):
+        self.screen.blit(self.background, (0, 0))
+        self.car_rects = []
+        self.last_light = None
+        self.caption = None
+        pygame.display.update()
+
+    def show_frame(self, replay, frame):
+        offsets = replay['offset']
+        end = offsets[frame + 1] if frame + 1 < len(offsets) else len(replay['x'])
+        dirty = []
+        for rect in self.car_rects:
+            self.screen.blit(self.background, rect, rect)
+        dirty.extend(self.car_rects)
+
+        self.car_rects = []
+        for i in range(offsets[frame], end):
+            size = (40, 20) if HORIZONTAL[replay['dir'][i]] else (20, 40)
+            self.car_rects.append(pygame.Rect(int(replay['x'][i]), int(replay['y'][i]), *size))
+
+        # The light goes under the cars, so it is redrawn whenever a car covers or uncovers it
+        light = (int(replay['light'][frame]), int(replay['buffer'][frame]) > 0)
+        if light != self.last_light or pygame.Rect(LIGHT_RECT).collidelist(dirty + self.car_rects) != -1:
+            self.light.state = 'north-south' if light[0] else 'east-west'
+            self.light.buffer_time = 1 if light[1] else 0
+            self.light.draw(self.screen)
+            dirty.append(pygame.Rect(LIGHT_RECT))
+            self.last_light = light
+
+        for rect in self.car_rects:
+            pygame.draw.rect(self.screen, BLACK, rect)
+        dirty.extend(self.car_rects)
+
+        caption = "gen {0}  genome {1}  fitness {2:.3f}  t={3:.1f}s".format(
+            int(replay.get('generation', -1)), int(replay.get('genome', -1)), float(replay.get('fitness', 0)),
+            replay['time'][frame] / 1000)
+        if caption != self.caption:
+            self.screen.blit(self.background, CAPTION_RECT, CAPTION_RECT)
+            self.screen.blit(self.font.render(caption, True, BLACK), CAPTION_RECT[:2])
+            dirty.append(pygame.Rect(CAPTION_RECT))
+            self.caption = caption
+        pygame.display.update(dirty)
+
+    def play(self, replay, speed=1.0):
+        # Returns False once the window is closed
+        clock = pygame.time.Clock()
+        self.start(replay)
+        for frame in range(len(replay['time'])):
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    return False
+            self.show_frame(replay, frame)
+            clock.tick(1000 / TICK_MS * speed)
+        return True
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded runs from training")
+    parser.add_argument('path', help="a replay .npz file, or a directory of them to play the newest from")
+    parser.add_argument('--speed', type=float, default=1.0, help="playback speed, 1 = real time")
+    parser.add_argument('--follow', action='store_true', help="keep playing the newest replay in the directory")
+    args = parser.parse_args(argv)
+
+    pygame.init()
+    screen = pygame.display.set_mode((width, height))
+    pygame.display.set_caption("Traffic Intersection Replay")
+    viewer = ReplayViewer(screen)
+    while True:
+        path = newest_replay(args.path) if os.path.isdir(args.path) else args.path
+        if path is None:
+            time.sleep(1)  # Waiting for training to write the first one
+            continue
+        if not viewer.play(load_replay(path), args.speed) or not args.follow:
+            break
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main_cli()
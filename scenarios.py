@@ -0,0 +1,80 @@
+import os
+import random
+import argparse
+import numpy as np
+
+from simulation import DIRECTIONS, TICK_MS
+
+# One arrival per record, 6 bytes each. lane is always 0 for now, every road has one lane per direction
+ARRIVAL_DTYPE = np.dtype([('time', '<u4'), ('direction', 'u1'), ('lane', 'u1')])
+
+# Demand profiles: mean milliseconds between cars, relative demand per direction
+# (in DIRECTIONS order, None = pick uniformly) and whether gaps are random (Poisson) or fixed
+PROFILES = {
+    'uniform': (800, None, False),  # The traffic main.py has always used
+    'heavy': (500, None, True),
+    'sparse': (5000, None, True),
+    'east-west-rush': (600, [3, 3, 1, 1], True),
+    'one-way-north': (700, [1, 1, 1, 4], True),
+}
+
+
+def generate_arrivals(seed, profile='uniform', count=1000):
+    # Precompute count arrivals. The 'uniform' profile gives exactly the cars that
+    # simulation.random_arrivals(seed) would.
+    interval, weights, poisson = PROFILES[profile]
+    rng = random.Random(seed)
+    arrivals = np.zeros(count, dtype=ARRIVAL_DTYPE)
+    time = 0
+    for i in range(count):
+        gap = rng.expovariate(1 / interval) if poisson else rng.randint(interval, interval)
+        if weights is None:
+            direction = rng.choice(DIRECTIONS)
+        else:
+            direction = rng.choices(DIRECTIONS, weights)[0]
+        arrivals[i] = (time, DIRECTIONS.index(direction), 0)
+        time += max(1, -int(-gap // TICK_MS)) * TICK_MS  # Cars appear on frames, at most one per frame
+    return arrivals
+
+
+def scenario_path(directory, profile, seed):
+    return os.path.join(directory, "{0}-{1}.arrivals".format(profile, seed))
+
+
+def save_scenarios(directory, seeds, profile='uniform', count=1000):
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for seed in seeds:
+        path = scenario_path(directory, profile, seed)
+        generate_arrivals(seed, profile, count).tofile(path)
+        paths.append(path)
+    return paths
+
+
+# Scenarios already mapped by this process, so every genome shares the same pages
+loaded = {}
+
+
+def load_scenario(path):
+    # Memory-map an arrivals file. Nothing is copied, and processes reading the
+    # same file share it through the page cache.
+    if path not in loaded:
+        loaded[path] = np.memmap(path, dtype=ARRIVAL_DTYPE, mode='r')
+    return loaded[path]
+
+
+def iter_arrivals(arrivals):
+    # (time, direction) pairs in the form the simulators take
+    for time, direction, lane in arrivals:
+        yield int(time), DIRECTIONS[direction]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Precompute arrival traces for training")
+    parser.add_argument('--out', default='scenarios', help="directory to write the .arrivals files to")
+    parser.add_argument('--profile', default='uniform', choices=sorted(PROFILES))
+    parser.add_argument('--seeds', type=int, default=10, help="write seeds 0 to SEEDS-1")
+    parser.add_argument('--count', type=int, default=1000, help="cars per scenario")
+    args = parser.parse_args()
+    for path in save_scenarios(args.out, range(args.seeds), args.profile, args.count):
+        print(path)
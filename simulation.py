@@ -0,0 +1,377 @@
+import random
+from collections import deque
+from time import perf_counter
+# pygame is imported where something is drawn, so headless runs and workers never load it
+
+# Screen size
+width, height = 800, 600
+
+# Colors
+WHITE = (255, 255, 255)
+RED = (255, 0, 0)
+GREEN = (0, 255, 0)
+YELLOW = (255, 255, 0)
+BLACK = (0, 0, 0)
+GRAY = (169, 169, 169)
+
+# Intersection stopping zones
+STOP_ZONE_X_E = width // 2 - 100
+STOP_ZONE_Y_W = height // 2 - 100
+STOP_ZONE_X_W = width // 2 + 100
+STOP_ZONE_Y_E = height // 2 + 100
+
+TICK_MS = 30  # Length of one frame in milliseconds (matches TrafficLight.update)
+MIN_TRIP_MS = ((height + 30) // 6 + 1) * TICK_MS  # Fastest a car can cross the screen (north/south road, speed 6)
+MISSING_CAR_PENALTY = 20000  # Milliseconds charged per missing car when a genome is stopped early
+DIRECTIONS = ['east-west', 'west-east', 'north-south', 'south-north']
+AXES = {'east-west': ['east-west', 'west-east'], 'north-south': ['north-south', 'south-north']}
+
+# Cars store their direction as an index into DIRECTIONS and look everything that
+# depends on it up in the tables below instead of comparing strings
+EAST_WEST, WEST_EAST, NORTH_SOUTH, SOUTH_NORTH = range(4)
+DIRECTION_AXIS = ['east-west', 'east-west', 'north-south', 'north-south']
+HORIZONTAL = [True, True, False, False]  # Moves along x rather than y
+SPEED = [6, -6, 6, -6]  # Change in x or y per frame
+SPAWN_POS = [(0, 315), (width, 270), (370, 0), (415, height)]
+MIDDLE = [width // 2, width // 2, height // 2, height // 2]  # Crossed the intersection once past this
+EXIT_POS = [width + 30, -30, height + 30, -30]  # Off screen once past this
+# Stop zone for a car with cars_at_time cars ahead: lo_base + lo_slope * cars_at_time
+# <= x or y <= hi_base + hi_slope * cars_at_time
+STOP_ZONES = [(STOP_ZONE_X_E + 50, -50, STOP_ZONE_X_E + 10, 0),
+              (STOP_ZONE_X_W - 50, 0, STOP_ZONE_X_W - 90, 50),
+              (STOP_ZONE_Y_W + 50, -50, STOP_ZONE_Y_W + 10, 0),
+              (STOP_ZONE_Y_E - 50, 0, STOP_ZONE_Y_E - 90, 50)]
+
+
+# Car class. Cars are recycled by IntersectionSim, so all state is set in reset()
+class Car:
+    __slots__ = ('x', 'y', 'dir', 'speed', 'is_stopped', 'passed_intersection', 'start_time', 'cars_at_time',
+                 'axis', 'horizontal', 'middle', 'stop_lo', 'stop_hi')
+
+    def __init__(self, x, y, d, start_time, cars_at_time):
+        self.reset(x, y, d, start_time, cars_at_time)
+
+    def reset(self, x, y, d, start_time, cars_at_time):
+        self.x = x
+        self.y = y
+        self.dir = d  # Index into DIRECTIONS
+        self.speed = SPEED[d]
+        self.is_stopped = False
+        self.passed_intersection = False
+        self.start_time = start_time
+        self.cars_at_time = cars_at_time  # Cars ahead in this direction when spawned (including this one)
+        self.axis = DIRECTION_AXIS[d]
+        self.horizontal = HORIZONTAL[d]
+        self.middle = MIDDLE[d]
+        lo_base, lo_slope, hi_base, hi_slope = STOP_ZONES[d]
+        self.stop_lo = lo_base + lo_slope * cars_at_time
+        self.stop_hi = hi_base + hi_slope * cars_at_time
+
+    @property
+    def direction(self):
+        return DIRECTIONS[self.dir]
+
+    def move(self, traffic_light):
+        # Stop in the stop zone unless the light is green for this road
+        position = self.x if self.horizontal else self.y
+        near_intersection = self.stop_lo <= position <= self.stop_hi
+        stop_for_red = traffic_light.state != self.axis or traffic_light.color == RED
+        self.is_stopped = near_intersection and stop_for_red
+
+        # Move if not stopped
+        if not self.is_stopped:
+            if self.horizontal:
+                self.x += self.speed
+            else:
+                self.y += self.speed
+
+    def passedIntersection(self, lane):
+        # lane is this car's LaneQueue, which counts the cars that have crossed
+        if not self.passed_intersection:
+            position = self.x if self.horizontal else self.y
+            if (position - self.middle) * self.speed > 0:  # Past the middle in the direction of travel
+                lane.crossed += 1
+                self.passed_intersection = True
+        return self.passed_intersection
+
+    def draw(self, screen):
+        import pygame
+        if self.horizontal:
+            pygame.draw.rect(screen, BLACK, (self.x, self.y, 40, 20))  # Horizontal car
+        else:
+            pygame.draw.rect(screen, BLACK, (self.x, self.y, 20, 40))  # Vertical car
+
+    def off_screen(self):
+        position = self.x if self.horizontal else self.y
+        return (position - EXIT_POS[self.dir]) * self.speed > 0
+
+    def get_final_time(self, current_time):
+        return current_time - self.start_time
+
+    def get_start_time(self):
+        return self.start_time
+
+
+# Traffic light class
+class TrafficLight:
+    def __init__(self):
+        self.state = 'east-west'  # 'east-west' or 'north-south'
+        self.color = GREEN
+        self.buffer_time = 0  # Buffer time for delay after light change
+
+    def change(self):
+        # Switch between directions and apply buffer time
+        if self.buffer_time == 0:  # Only change if there's no active buffer
+            self.buffer_time = 2000  # 2 second buffer time
+            if self.state == 'east-west':
+                self.state = 'north-south'
+                self.color = GREEN
+            else:
+                self.state = 'east-west'
+                self.color = GREEN  # Ensure green for the switched state
+
+    def update(self):
+        # Decrease buffer time and stop cars from moving during this time
+        if self.buffer_time > 0:
+            self.buffer_time -= TICK_MS  # Decrease by one frame (30 milliseconds)
+        elif self.buffer_time < 0:
+            self.buffer_time = 0
+
+    def draw(self, screen):
+        import pygame
+        # Set light color based on buffer_time
+        if self.buffer_time > 0:
+            light_color = YELLOW  # Show yellow light when buffer_time is not zero
+        else:
+            light_color = GREEN if self.state == 'north-south' else RED
+        pygame.draw.rect(screen, BLACK, (width // 2 - 25, height // 2 - 25, 50, 50))
+        pygame.draw.circle(screen, light_color, (width // 2, height // 2), 20)
+
+
+# The original car spawner: a random direction every spawn_interval milliseconds, measured
+# from the frame the previous car appeared on. Yields (time, direction) pairs forever.
+def random_arrivals(seed=None, spawn_interval=800):
+    rng = random.Random(seed)
+    time = 0
+    while True:
+        interval = rng.randint(spawn_interval, spawn_interval)
+        yield time, rng.choice(DIRECTIONS)
+        time += -(-interval // TICK_MS) * TICK_MS  # Next frame at least interval later
+
+
+# FIFO of the cars driving in one direction, oldest arrival at the front. Totals are
+# kept up to date on push/remove so reading them does not loop over the cars.
+class LaneQueue:
+    def __init__(self):
+        self.cars = deque()
+        self.sum_start_time = 0
+        self.crossed = 0  # Cars in the queue that are past the middle of the intersection
+
+    def __len__(self):
+        return len(self.cars)
+
+    def push(self, car):
+        self.cars.append(car)
+        self.sum_start_time += car.start_time
+
+    def remove(self, car):
+        # Cars almost always leave from the front, a car that overtook a stopped one does not
+        if self.cars[0] is car:
+            self.cars.popleft()
+        else:
+            self.cars.remove(car)
+        self.sum_start_time -= car.start_time
+        if car.passed_intersection:
+            self.crossed -= 1
+
+    def waiting(self):
+        # Cars that have not crossed the intersection yet
+        return len(self.cars) - self.crossed
+
+    def summed_wait(self, now):
+        return len(self.cars) * now - self.sum_start_time
+
+
+# Clock that only advances when told to, one TICK_MS step per frame
+class SimClock:
+    def __init__(self):
+        self.ticks = 0
+
+    def get_ticks(self):
+        return self.ticks
+
+    def tick(self):
+        self.ticks += TICK_MS
+
+
+# Clock backed by pygame's wall clock, used when drawing to the screen
+class WallClock:
+    def get_ticks(self):
+        import pygame
+        return pygame.time.get_ticks()
+
+    def tick(self):
+        import pygame
+        pygame.time.delay(TICK_MS)
+
+
+# One intersection with its cars, light and counters for evaluating a single network
+class IntersectionSim:
+    def __init__(self, network, seed=None, clock=None, screen=None, cars_to_finish=10, spawn_interval=800,
+                 arrivals=None, profiler=None, recorder=None):
+        self.network = network
+        self.clock = clock if clock is not None else SimClock()
+        self.screen = screen  # Draw every frame when a pygame surface is given
+        self.cars_to_finish = cars_to_finish
+        # (time, direction) pairs in time order, random traffic from seed unless given
+        self.arrivals = iter(arrivals) if arrivals is not None else random_arrivals(seed, spawn_interval)
+        self.next_arrival = next(self.arrivals, None)
+
+        self.traffic_light = TrafficLight()
+        self.lanes = {direction: LaneQueue() for direction in DIRECTIONS}
+        self.lane_list = [self.lanes[direction] for direction in DIRECTIONS]  # Indexed by Car.dir
+        self.free_cars = []  # Deleted cars, reused by spawn_car
+        self.total_time = 0
+        self.cars_finished = 0
+        self.start_ticks = self.clock.get_ticks()
+        self.ticks = 0  # Frames simulated
+        self.cars_spawned = 0
+        self.profiler = profiler  # profiling.PhaseProfiler, or None for no timing
+        self.recorder = recorder  # recording.StateRecorder, gets the state after every frame
+
+    def cars(self):
+        for lane in self.lanes.values():
+            yield from lane.cars
+
+    def delete_car(self, car_to_remove, time):
+        self.total_time += car_to_remove.get_final_time(time)
+        self.cars_finished += 1
+        self.lane_list[car_to_remove.dir].remove(car_to_remove)
+        self.free_cars.append(car_to_remove)
+
+    def get_inputs(self):
+        # Get the current state for the network input: summed start times of the cars on each road
+        cars_waiting_ew = sum(self.lanes[direction].sum_start_time for direction in AXES['east-west'])
+        cars_waiting_ns = sum(self.lanes[direction].sum_start_time for direction in AXES['north-south'])
+
+        if self.traffic_light.state == 'east-west' or self.traffic_light.state == 'west-east':
+            light_state = 1  # green
+        else:
+            light_state = 0  # red
+
+        return [float(cars_waiting_ew), float(cars_waiting_ns), light_state]
+
+    def spawn_car(self, direction):
+        d = DIRECTIONS.index(direction)
+        lane = self.lane_list[d]
+        x, y = SPAWN_POS[d]
+        if self.free_cars:
+            car = self.free_cars.pop()
+            car.reset(x, y, d, self.clock.get_ticks(), lane.waiting() + 1)
+        else:
+            car = Car(x, y, d, self.clock.get_ticks(), lane.waiting() + 1)
+        lane.push(car)
+
+    def step(self):
+        profiler = self.profiler  # Times each phase when set, costs one check per phase otherwise
+        if profiler is not None:
+            profiler.start()
+
+        inputs = self.get_inputs()
+        if profiler is not None:
+            profiler.lap('inputs')
+
+        # Get the network decision
+        output = self.network.activate(inputs)
+        if profiler is not None:
+            profiler.lap('activate')
+
+        if output[0] > 0.5 or output[0] < 0.00001:  # If the output is greater than 0.5, change the light
+            self.traffic_light.change()
+        self.traffic_light.update()
+        if profiler is not None:
+            profiler.lap('light')
+
+        current_time = self.clock.get_ticks() - self.start_ticks
+        if self.next_arrival is not None and current_time >= self.next_arrival[0]:
+            self.spawn_car(self.next_arrival[1])
+            self.next_arrival = next(self.arrivals, None)
+            self.cars_spawned += 1
+        if profiler is not None:
+            profiler.lap('spawn')
+
+        # Move cars and check if they passed the intersection, removing finished cars afterwards
+        finished = []
+        for lane in self.lanes.values():
+            for car in lane.cars:
+                if car.off_screen():
+                    finished.append(car)
+                else:
+                    car.passedIntersection(lane)
+                    car.move(self.traffic_light)
+        if profiler is not None:
+            profiler.lap('move')
+
+        now = self.clock.get_ticks()
+        for car in finished:
+            self.delete_car(car, now)
+        if profiler is not None:
+            profiler.lap('delete')
+
+        if self.recorder is not None:
+            self.recorder.record(self)
+
+        if self.screen is not None:
+            self.draw(self.screen)
+            if profiler is not None:
+                profiler.lap('draw')
+            import pygame
+            pygame.display.update()
+            if profiler is not None:
+                profiler.lap('display')
+        self.clock.tick()
+        self.ticks += 1
+
+    def draw(self, screen):
+        import pygame
+        screen.fill(WHITE)  # Clear the screen for each frame
+        pygame.draw.rect(screen, GRAY, (0, height // 2 - 50, width, 100))  # horizontal road
+        pygame.draw.rect(screen, GRAY, (width // 2 - 50, 0, 100, height))  # vertical road
+        self.traffic_light.draw(screen)
+        for car in self.cars():
+            car.draw(screen)
+
+    def fitness(self):
+        return 1 / (self.total_time / (4000 * self.cars_to_finish))  # 4000 <- time for car to pass without stopping on average
+
+    def partial_fitness(self):
+        # Fitness for a genome stopped before it finished: cars still on the road count with
+        # the time they have waited so far, and every car short of cars_to_finish is penalized
+        now = self.clock.get_ticks()
+        waited = sum(lane.summed_wait(now) for lane in self.lanes.values())
+        missing = max(0, self.cars_to_finish - self.cars_finished)
+        return 1 / ((self.total_time + waited + missing * MISSING_CAR_PENALTY) / (4000 * self.cars_to_finish))
+
+    def best_possible_fitness(self):
+        # Every car still needed takes at least MIN_TRIP_MS, so the fitness can't end up above this
+        missing = max(0, self.cars_to_finish - self.cars_finished)
+        return 1 / ((self.total_time + missing * MIN_TRIP_MS) / (4000 * self.cars_to_finish))
+
+    def run(self, max_ticks=None, max_seconds=None, abort_below=None):
+        # Stops early after max_ticks frames, after max_seconds of wall time, or once the genome
+        # can't reach abort_below any more. It then gets partial_fitness() and self.stopped says why.
+        deadline = perf_counter() + max_seconds if max_seconds is not None else None
+        self.stopped = None
+        while self.cars_finished < self.cars_to_finish:
+            if max_ticks is not None and self.ticks >= max_ticks:
+                self.stopped = 'ticks'
+            elif deadline is not None and perf_counter() > deadline:
+                self.stopped = 'time'
+            elif abort_below is not None and self.best_possible_fitness() < abort_below:
+                self.stopped = 'abort'
+            if self.stopped is not None:
+                break
+            self.step()
+        if self.profiler is not None:
+            self.profiler.genome_done(self.ticks, self.cars_spawned, self.cars_finished)
+        return self.fitness() if self.stopped is None else self.partial_fitness()
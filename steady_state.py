@@ -0,0 +1,127 @@
+import math
+import queue
+import random
+from time import perf_counter
+from multiprocessing import Pool
+import neat
+
+
+def timed_eval(eval_function, genome, config):
+    start = perf_counter()
+    fitness = eval_function(genome, config)
+    return fitness, perf_counter() - start
+
+
+# Steady-state NEAT without a generation barrier. Workers always have genomes queued: as
+# soon as one finishes it joins the population, the worst genome is dropped once there are
+# more than pop_size, and a new child is bred from the current species and sent out.
+# Every pop_size evaluations count as a generation: the population is speciated again,
+# DefaultStagnation updates the species and the reporters see the usual callbacks.
+class SteadyStatePopulation(neat.Population):
+    def __init__(self, config, workers=1, initial_state=None):
+        neat.Population.__init__(self, config, initial_state)
+        self.workers = workers
+        self.in_flight = workers * 2  # Genomes handed out at once, so no worker waits for the next one
+        self.stagnant = set()  # Species keys DefaultStagnation called stagnant, not bred from
+
+    def pick_parents(self):
+        # A species chosen with probability by adjusted fitness as in DefaultReproduction,
+        # then two parents from its top survival_threshold
+        reproduction_config = self.reproduction.reproduction_config
+        groups = []
+        for sid, s in self.species.species.items():
+            members = [self.population[key] for key in s.members if key in self.population]
+            if members and sid not in self.stagnant:
+                groups.append(members)
+        if not groups:
+            groups = [list(self.population.values())]
+
+        fitnesses = [genome.fitness for genome in self.population.values()]
+        low = min(fitnesses)
+        fitness_range = max(1.0, max(fitnesses) - low)
+        weights = [(sum(g.fitness for g in members) / len(members) - low) / fitness_range + 1e-3
+                   for members in groups]
+        members = random.choices(groups, weights)[0]
+        members.sort(key=lambda genome: genome.fitness, reverse=True)
+        cutoff = max(2, int(math.ceil(reproduction_config.survival_threshold * len(members))))
+        members = members[:cutoff]
+        return random.choice(members), random.choice(members)
+
+    def breed(self):
+        parent1, parent2 = self.pick_parents()
+        gid = next(self.reproduction.genome_indexer)
+        child = self.config.genome_type(gid)
+        child.configure_crossover(parent1, parent2, self.config.genome_config)
+        child.mutate(self.config.genome_config)
+        self.reproduction.ancestors[gid] = (parent1.key, parent2.key)
+        return child
+
+    def end_round(self):
+        # The generation bookkeeping Population.run does between generations
+        self.stagnant = {sid for sid, s, stagnant in self.reproduction.stagnation.update(self.species, self.generation)
+                         if stagnant}
+        self.reporters.end_generation(self.config, self.population, self.species)
+        self.generation += 1
+
+    def run(self, eval_function, n=None):
+        # eval_function(genome, config) returns one genome's fitness and runs in the worker
+        # processes, like ParallelEvaluator's. n counts rounds of pop_size evaluations.
+        pop_size = self.config.pop_size
+        unevaluated = list(self.population.values())
+        self.population = {}
+        done = queue.Queue()
+        pool = Pool(self.workers)
+
+        def submit(genome):
+            pool.apply_async(timed_eval, (eval_function, genome, self.config),
+                             callback=lambda result: done.put((genome, result)),
+                             error_callback=lambda error: done.put((genome, error)))
+
+        for genome in unevaluated[:self.in_flight]:
+            submit(genome)
+        unevaluated = unevaluated[self.in_flight:]
+
+        start = perf_counter()
+        busy = 0.0
+        evaluations = 0
+        rounds = 0
+        self.reporters.start_generation(self.generation)
+        try:
+            while n is None or rounds < n:
+                genome, result = done.get()
+                if isinstance(result, Exception):
+                    raise result
+                genome.fitness, seconds = result
+                busy += seconds
+                evaluations += 1
+                self.population[genome.key] = genome
+                if len(self.population) > pop_size:
+                    worst = min(self.population.values(), key=lambda g: g.fitness)
+                    del self.population[worst.key]
+                if self.best_genome is None or genome.fitness > self.best_genome.fitness:
+                    self.best_genome = genome
+
+                if evaluations % pop_size == 0:
+                    rounds += 1
+                    self.species.speciate(self.config, self.population, self.generation)
+                    best = max(self.population.values(), key=lambda g: g.fitness)
+                    self.reporters.post_evaluate(self.config, self.population, self.species, best)
+                    self.reporters.info("Steady state: {0} evaluations, {1:.0%} worker utilization".format(
+                        evaluations, busy / ((perf_counter() - start) * self.workers)))
+                    if not self.config.no_fitness_termination:
+                        fv = self.fitness_criterion(g.fitness for g in self.population.values())
+                        if fv >= self.config.fitness_threshold:
+                            self.reporters.found_solution(self.config, self.generation, best)
+                            break
+                    self.end_round()
+                    if n is None or rounds < n:
+                        self.reporters.start_generation(self.generation)
+
+                submit(unevaluated.pop() if unevaluated else self.breed())
+        finally:
+            pool.terminate()
+            pool.join()
+
+        if self.config.no_fitness_termination:
+            self.reporters.found_solution(self.config, self.generation, self.best_genome)
+        return self.best_genome
@@ -0,0 +1,172 @@
+import numpy as np
+import neat
+from neat.reporting import BaseReporter
+
+from simulation import DIRECTIONS, AXES, TICK_MS, MISSING_CAR_PENALTY, random_arrivals
+from event_sim import SPEED, START, EXIT, AXIS, BUFFER_TICKS, stop_zone
+
+SURROGATE_STEP_MS = 60  # The model and the network move in steps of 2 frames, coarser steps rank genomes badly
+
+
+def stop_position(direction, cars_at_time):
+    # Where Car.move leaves a car with cars_at_time cars ahead on a red light, in event_sim's travel coordinates
+    lo, hi = stop_zone(direction, cars_at_time)
+    return START[direction] + SPEED * -(-(lo - START[direction]) // SPEED)
+
+
+def trip_ms(direction, u):
+    # Time to drive from u until off screen
+    return ((EXIT[direction] - u) // SPEED + 1) * TICK_MS
+
+
+# Point-queue model of the intersection. Cars are not moved: a car's arrival at its stop
+# position and its exit are worked out in closed form, and cars reaching a red light wait in
+# their lane's queue until it turns green, when the whole queue drives off together as in
+# Car.move. The network sees IntersectionSim's inputs every step_ms and the light follows
+# TrafficLight's change rule and buffer.
+def surrogate_fitness(network, seed=None, arrivals=None, cars_to_finish=10, spawn_interval=800, max_ms=600000,
+                      step_ms=SURROGATE_STEP_MS):
+    arrivals = iter(arrivals) if arrivals is not None else random_arrivals(seed, spawn_interval)
+    next_arrival = next(arrivals, None)
+    light = 'east-west'
+    ready_time = 0  # When TrafficLight's buffer lets the light change again
+    approaching = {direction: [] for direction in DIRECTIONS}  # (stop time, start time, stop position)
+    queued = {direction: [] for direction in DIRECTIONS}  # (start time, stop position)
+    exits = []  # (exit time, start time, axis)
+    sum_start = {'east-west': 0, 'north-south': 0}
+    total_time = 0
+    finished = 0
+    now = 0
+    while finished < cars_to_finish and now < max_ms:
+        while next_arrival is not None and next_arrival[0] <= now:
+            direction = next_arrival[1]
+            waiting = len(approaching[direction]) + len(queued[direction])
+            u = stop_position(direction, waiting + 1)
+            start = -(-next_arrival[0] // TICK_MS) * TICK_MS
+            approaching[direction].append((start + (u - START[direction]) // SPEED * TICK_MS, start, u))
+            sum_start[AXIS[direction]] += start
+            next_arrival = next(arrivals, None)
+
+        # Cars that got to their stop position since the last step saw the light as it was then
+        for direction in DIRECTIONS:
+            still = []
+            for stop_time, start, u in approaching[direction]:
+                if stop_time > now:
+                    still.append((stop_time, start, u))
+                elif AXIS[direction] == light:
+                    exits.append((start + trip_ms(direction, START[direction]), start, AXIS[direction]))
+                else:
+                    queued[direction].append((start, u))
+            approaching[direction] = still
+
+        output = network.activate([float(sum_start['east-west']), float(sum_start['north-south']),
+                                   1 if light == 'east-west' else 0])
+        if (output[0] > 0.5 or output[0] < 0.00001) and ready_time <= now:
+            light = 'north-south' if light == 'east-west' else 'east-west'
+            ready_time = now + BUFFER_TICKS * TICK_MS
+            for direction in AXES[light]:
+                exits.extend((now + trip_ms(direction, u), start, light) for start, u in queued[direction])
+                queued[direction] = []
+
+        remaining = []
+        for exit_time, start, axis in exits:
+            if exit_time <= now:
+                total_time += exit_time - start
+                finished += 1
+                sum_start[axis] -= start
+            else:
+                remaining.append((exit_time, start, axis))
+        exits = remaining
+        now += step_ms
+
+    missing = max(0, cars_to_finish - finished)
+    return 1 / ((total_time + missing * MISSING_CAR_PENALTY) / (4000 * cars_to_finish))
+
+
+def rank_correlation(a, b):
+    # Spearman's rho, ties get their average rank
+    def ranks(values):
+        values = np.asarray(values, dtype=float)
+        order = np.argsort(values, kind='mergesort')
+        result = np.empty(len(values))
+        result[order] = np.arange(len(values))
+        for value in np.unique(values):
+            tied = values == value
+            result[tied] = result[tied].mean()
+        return result
+    if len(a) < 3:
+        return float('nan')
+    ra, rb = ranks(a), ranks(b)
+    if ra.std() == 0 or rb.std() == 0:
+        return float('nan')
+    return float(np.corrcoef(ra, rb)[0, 1])
+
+
+# Wraps a population.run fitness function so only the best `fraction` of genomes by
+# surrogate_fitness are simulated, along with any genome simulated last generation. The
+# rest get their surrogate fitness, capped below the worst simulated genome so they never
+# outrank one. Every audit_every generations everyone is simulated, which gives an unbiased
+# rank correlation between the surrogate and the simulation; in between the correlation
+# is only over the few simulated genomes, the ones the surrogate ranked best, so it is
+# biased and reported apart from the audit one.
+class SurrogateEvaluator:
+    def __init__(self, evaluate, fraction=0.3, audit_every=5, seed=None, get_arrivals=None):
+        self.evaluate_function = evaluate
+        self.fraction = fraction
+        self.audit_every = audit_every
+        self.seed = seed
+        self.get_arrivals = get_arrivals  # Called for fresh arrivals, None for random traffic from seed
+        self.generation = 0
+        self.simulated = set()  # Genome ids simulated last generation, survivors are simulated again
+        self.last = None  # (simulated, total, rank correlation, audited) for the reporter
+        self.audit = None  # (generation, rank correlation) of the latest audit
+
+    def predict(self, genome, config):
+        network = neat.nn.FeedForwardNetwork.create(genome, config)
+        arrivals = self.get_arrivals() if self.get_arrivals is not None else None
+        return surrogate_fitness(network, self.seed, arrivals)
+
+    def evaluate(self, genomes, config):
+        genomes = list(genomes)
+        predicted = {genome_id: self.predict(genome, config) for genome_id, genome in genomes}
+        audit = self.audit_every > 0 and self.generation % self.audit_every == 0
+        self.generation += 1
+
+        ranked = sorted(genomes, key=lambda item: predicted[item[0]], reverse=True)
+        count = len(ranked) if audit else max(2, int(round(len(ranked) * self.fraction)))
+        simulated = ranked[:count] + [item for item in ranked[count:] if item[0] in self.simulated]
+        skipped = [item for item in ranked[count:] if item[0] not in self.simulated]
+        self.evaluate_function(simulated, config)
+        self.simulated = {genome_id for genome_id, genome in simulated}
+        floor = min(genome.fitness for genome_id, genome in simulated)
+        for genome_id, genome in skipped:
+            genome.fitness = min(predicted[genome_id], floor)
+
+        rho = rank_correlation([predicted[genome_id] for genome_id, genome in simulated],
+                               [genome.fitness for genome_id, genome in simulated])
+        self.last = (len(simulated), len(genomes), rho, audit)
+        if audit:
+            self.audit = (self.generation - 1, rho)
+
+
+def format_rho(rho):
+    return "n/a" if rho != rho else "{0:.3f}".format(rho)  # nan when fitness is all tied
+
+
+# Prints how many genomes were simulated and how well the surrogate ranked them
+class SurrogateReporter(BaseReporter):
+    def __init__(self, evaluator):
+        self.evaluator = evaluator
+
+    def post_evaluate(self, config, population, species, best_genome):
+        if self.evaluator.last is None:
+            return
+        simulated, total, rho, audit = self.evaluator.last
+        if audit:
+            print("Surrogate: audit, all {0} genomes simulated, rank correlation {1}".format(total, format_rho(rho)))
+            return
+        line = "Surrogate: simulated {0} of {1}".format(simulated, total)
+        if self.evaluator.audit is not None:
+            generation, audit_rho = self.evaluator.audit
+            line += ", rank correlation {0} at the last audit (generation {1})".format(format_rho(audit_rho), generation)
+        print(line + ", {0} among the {1} simulated (top-ranked only, biased)".format(format_rho(rho), simulated))
@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import traceback
+import random
+import sqlite3
+import hashlib
+import argparse
+import itertools
+import tempfile
+import configparser
+from multiprocessing import Pool
+import neat
+from neat.reporting import BaseReporter
+
+import main
+import scenarios
+from racing import RacingEvaluator
+
+# Example spec, every key but one of grid/random optional:
+# {"grid": {"pop_size": [10, 50], "compatibility_threshold": [2.0, 3.0]},
+#  "random": {"samples": 8, "params": {"conn_add_prob": [0.1, 0.9], "node_add_prob": [0.05, 0.5]}},
+#  "seeds": [0, 1], "generations": 20, "profile": "uniform", "scenarios": 4, "search_seed": 0}
+# Random params are sampled uniformly from [low, high], as ints when both bounds are ints.
+
+
+def config_variants(spec):
+    # Every parameter combination the spec asks for, as dicts of config-feedforward options
+    variants = []
+    grid = spec.get('grid', {})
+    if grid:
+        names = sorted(grid)
+        for values in itertools.product(*(grid[name] for name in names)):
+            variants.append(dict(zip(names, values)))
+    search = spec.get('random')
+    if search:
+        rng = random.Random(spec.get('search_seed', 0))
+        for _ in range(search['samples']):
+            variant = {}
+            for name, (low, high) in sorted(search['params'].items()):
+                if isinstance(low, int) and isinstance(high, int):
+                    variant[name] = rng.randint(low, high)
+                else:
+                    variant[name] = rng.uniform(low, high)
+            variants.append(variant)
+    return variants or [{}]
+
+
+def write_config(params, path, base=main.CONFIG_FILE):
+    # Copy of the base config with params set in whichever section has them
+    parser = configparser.ConfigParser()
+    parser.read(base)
+    for name, value in params.items():
+        sections = [section for section in parser.sections() if parser.has_option(section, name)]
+        if not sections:
+            raise ValueError("no option {0!r} in {1}".format(name, base))
+        parser.set(sections[0], name, str(value))
+    with open(path, 'w') as f:
+        parser.write(f)
+
+
+def run_id(params, seed, generations, scenario_paths):
+    key = json.dumps([params, seed, generations, [os.path.basename(path) for path in scenario_paths]], sort_keys=True)
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def open_db(path):
+    db = sqlite3.connect(path, timeout=60)
+    db.execute("PRAGMA journal_mode=WAL")  # Runs write from several processes at once
+    db.execute("CREATE TABLE IF NOT EXISTS runs (run_id TEXT PRIMARY KEY, params TEXT, seed INTEGER, "
+               "status TEXT, best_fitness REAL, generations INTEGER, started REAL, finished REAL)")
+    db.execute("CREATE TABLE IF NOT EXISTS generations (run_id TEXT, generation INTEGER, best REAL, mean REAL, "
+               "stdev REAL, species INTEGER, PRIMARY KEY (run_id, generation))")
+    return db
+
+
+# Writes StatisticsReporter's numbers for every generation to the results database as it goes
+class DatabaseReporter(BaseReporter):
+    def __init__(self, db, run_id, stats):
+        self.db = db
+        self.run_id = run_id
+        self.stats = stats  # Must be added to the population before this reporter
+        self.generation = None
+
+    def start_generation(self, generation):
+        self.generation = generation
+
+    def post_evaluate(self, config, population, species, best_genome):
+        stats = self.stats
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO generations VALUES (?, ?, ?, ?, ?, ?)",
+                            (self.run_id, self.generation, stats.most_fit_genomes[-1].fitness,
+                             stats.get_fitness_mean()[-1], stats.get_fitness_stdev()[-1], len(species.species)))
+
+
+def run_one(job):
+    # One training run in a pool worker. Returns (run_id, best fitness, None), or (run_id,
+    # None, error) when the run failed, so one bad config doesn't stop the sweep.
+    run, params, seed, generations, scenario_paths, db_path, engine = job
+    db = open_db(db_path)
+    with db:
+        db.execute("DELETE FROM generations WHERE run_id = ?", (run,))  # Left over from an interrupted run
+        db.execute("INSERT OR REPLACE INTO runs VALUES (?, ?, ?, 'running', NULL, NULL, ?, NULL)",
+                   (run, json.dumps(params, sort_keys=True), seed, time.time()))
+
+    evaluator = None
+    try:
+        fd, config_path = tempfile.mkstemp(suffix='.cfg')
+        os.close(fd)
+        try:
+            write_config(params, config_path)
+            config = main.load_config(config_path)
+        finally:
+            os.remove(config_path)
+
+        random.seed(seed)
+        population = neat.Population(config)
+        stats = neat.StatisticsReporter()
+        population.add_reporter(stats)
+        population.add_reporter(DatabaseReporter(db, run, stats))
+        evaluator = RacingEvaluator(scenario_paths, first=len(scenario_paths), engine=engine,
+                                    max_ticks=main.MAX_TICKS or None)
+        winner = population.run(evaluator.evaluate, generations)
+    except Exception as error:
+        # A bad option in the config fails here as well as an error during training
+        with db:
+            db.execute("UPDATE runs SET status = 'failed', finished = ? WHERE run_id = ?", (time.time(), run))
+        db.close()
+        return run, None, "".join(traceback.format_exception_only(type(error), error)).strip()
+    finally:
+        if evaluator is not None:
+            evaluator.close()
+    with db:
+        db.execute("UPDATE runs SET status = 'done', best_fitness = ?, generations = ?, finished = ? WHERE run_id = ?",
+                   (winner.fitness, len(stats.most_fit_genomes), time.time(), run))
+    db.close()
+    return run, winner.fitness, None
+
+
+def run_sweep(spec, db_path='sweep.db', scenario_dir='scenarios', workers=None, engine='tick'):
+    # Runs every config variant on every seed, skipping runs the database has as done
+    seeds = spec.get('seeds', [0])
+    generations = spec.get('generations', 10)
+    # Every run is evaluated on the same traffic files, generated once and memory-mapped by all workers
+    scenario_paths = [scenarios.scenario_path(scenario_dir, spec.get('profile', 'uniform'), seed)
+                      for seed in range(spec.get('scenarios', 4))]
+    if not all(os.path.exists(path) for path in scenario_paths):
+        scenario_paths = scenarios.save_scenarios(scenario_dir, range(spec.get('scenarios', 4)),
+                                                  spec.get('profile', 'uniform'))
+
+    db = open_db(db_path)
+    done = {row[0] for row in db.execute("SELECT run_id FROM runs WHERE status = 'done'")}
+    db.close()
+    jobs = []
+    runs = []
+    for params in config_variants(spec):
+        for seed in seeds:
+            run = run_id(params, seed, generations, scenario_paths)
+            runs.append(run)
+            if run not in done:
+                jobs.append((run, params, seed, generations, scenario_paths, db_path, engine))
+    print("{0} runs to do, {1} already done".format(len(jobs), len(runs) - len(jobs)))
+
+    with Pool(workers or os.cpu_count()) as pool:
+        for run, fitness, error in pool.imap_unordered(run_one, jobs):
+            if error is not None:
+                print("{0} failed: {1}".format(run, error))
+            else:
+                print("{0} best fitness {1:.4f}".format(run, fitness))
+    return runs
+
+
+def summary(db_path, runs):
+    # Mean best fitness over seeds for each config variant among these runs
+    db = open_db(db_path)
+    rows = db.execute("SELECT params, AVG(best_fitness), COUNT(*) FROM runs WHERE status = 'done' AND run_id IN ({0}) "
+                      "GROUP BY params ORDER BY AVG(best_fitness) DESC".format(",".join("?" * len(runs))),
+                      runs).fetchall()
+    db.close()
+    for params, fitness, count in rows:
+        print("{0:.4f} over {1} seeds  {2}".format(fitness, count, params))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Train with many config-feedforward variants and record the results")
+    parser.add_argument('spec', help="JSON file with the grid and/or random search to run")
+    parser.add_argument('--db', default='sweep.db', help="SQLite results database, rerun with the same one to resume")
+    parser.add_argument('--scenarios', default='scenarios', help="directory for the shared arrival files")
+    parser.add_argument('--workers', type=int, help="runs at once, defaults to the number of CPUs")
+    parser.add_argument('--engine', default='tick', choices=['tick', 'event', 'batch'])
+    args = parser.parse_args()
+    with open(args.spec) as f:
+        runs = run_sweep(json.load(f), args.db, args.scenarios, args.workers, args.engine)
+    summary(args.db, runs)
@@ -0,0 +1,109 @@
+import os
+import sys
+import time
+import signal
+import threading
+import multiprocessing
+import pytest
+
+from distributed import Coordinator, run_worker
+
+
+class Genome:
+    def __init__(self, key):
+        self.key = key
+        self.fitness = None
+
+
+def slow_eval(genome, config):
+    time.sleep(0.05)
+    return genome.key * 2.0
+
+
+def start_workers(coordinator, count, settings=None):
+    workers = []
+    for _ in range(count):
+        process = multiprocessing.Process(target=run_worker, args=(coordinator.address, slow_eval, coordinator.authkey),
+                                          kwargs={'settings': settings, 'heartbeat_interval': 0.2}, daemon=True)
+        process.start()
+        workers.append(process)
+    return workers
+
+
+def wait_for_workers(coordinator, count):
+    deadline = time.time() + 10
+    while coordinator.workers < count and time.time() < deadline:
+        time.sleep(0.01)
+    assert coordinator.workers == count
+
+
+def finish(coordinator, workers):
+    coordinator.stop()
+    for process in workers:
+        process.join(10)
+    return [process.exitcode for process in workers]
+
+
+def test_killed_worker_batch_is_requeued():
+    coordinator = Coordinator(batch_size=2, heartbeat_timeout=1.0)
+    workers = start_workers(coordinator, 3)
+    wait_for_workers(coordinator, 3)
+    genomes = [(i, Genome(i)) for i in range(60)]
+    threading.Timer(0.5, os.kill, (workers[0].pid, signal.SIGKILL)).start()
+    coordinator.evaluate(genomes, 'config')
+    assert [genome.fitness for i, genome in genomes] == [i * 2.0 for i in range(60)]
+    assert coordinator.requeued >= 1
+
+    # The survivors keep going with the next generation
+    coordinator.evaluate(genomes[:10], 'config')
+    assert finish(coordinator, workers[1:]) == [0, 0]
+
+
+def test_stalled_worker_is_dropped_and_exits_cleanly_when_resumed():
+    coordinator = Coordinator(batch_size=2, heartbeat_timeout=1.0)
+    workers = start_workers(coordinator, 3)
+    wait_for_workers(coordinator, 3)
+    genomes = [(i, Genome(i)) for i in range(60)]
+    threading.Timer(0.5, os.kill, (workers[0].pid, signal.SIGSTOP)).start()
+    coordinator.evaluate(genomes, 'config')
+    assert [genome.fitness for i, genome in genomes] == [i * 2.0 for i in range(60)]
+    assert coordinator.requeued >= 1
+
+    os.kill(workers[0].pid, signal.SIGCONT)  # Finds its connection closed, no traceback
+    assert finish(coordinator, workers) == [0, 0, 0]
+
+
+def refusing_worker(address, authkey, settings):
+    # Exit status 3 tells the test run_worker refused
+    if not run_worker(address, slow_eval, authkey, settings):
+        sys.exit(3)
+
+
+def test_worker_with_other_settings_is_refused():
+    settings = {'engine': 'tick', 'seed': 1}
+    coordinator = Coordinator(batch_size=2, heartbeat_timeout=1.0, settings=settings)
+    # Connected first, so it gets the first batch
+    wrong = multiprocessing.Process(target=refusing_worker, daemon=True,
+                                    args=(coordinator.address, coordinator.authkey, {'engine': 'tick', 'seed': 2}))
+    wrong.start()
+    wait_for_workers(coordinator, 1)
+    right = start_workers(coordinator, 2, settings)
+    wait_for_workers(coordinator, 3)
+    genomes = [(i, Genome(i)) for i in range(20)]
+    coordinator.evaluate(genomes, 'config')
+    assert [genome.fitness for i, genome in genomes] == [i * 2.0 for i in range(20)]
+    wrong.join(10)
+    assert wrong.exitcode == 3
+    assert finish(coordinator, right) == [0, 0]
+
+
+def test_evaluate_gives_up_without_workers():
+    coordinator = Coordinator(heartbeat_timeout=0.2, worker_timeout=0.5)
+    with pytest.raises(RuntimeError):
+        coordinator.evaluate([(0, Genome(0))], 'config')
+    coordinator.stop()
+
+
+def test_non_loopback_needs_authkey():
+    with pytest.raises(ValueError):
+        Coordinator(('0.0.0.0', 0))
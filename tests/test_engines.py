@@ -0,0 +1,53 @@
+import random
+import pytest
+import numpy as np
+import neat
+
+import main
+import scenarios
+from simulation import IntersectionSim
+from event_sim import EventIntersectionSim
+from batch_sim import BatchIntersectionSim
+
+
+@pytest.fixture(scope='module')
+def networks():
+    # Random genomes with a few mutations, enough variety to hit stops, queues and budgets
+    config = main.load_config()
+    random.seed(3)
+    networks = []
+    for key in range(60):
+        genome = config.genome_type(key)
+        genome.configure_new(config.genome_config)
+        for _ in range(3):
+            genome.mutate(config.genome_config)
+        networks.append(neat.nn.FeedForwardNetwork.create(genome, config))
+    return networks
+
+
+@pytest.mark.parametrize('seed, spawn_interval, max_ticks', [(0, 800, None), (2, 800, 300), (5, 400, 1000),
+                                                            (7, 1200, 20000)])
+def test_engines_give_the_same_fitness(networks, seed, spawn_interval, max_ticks):
+    tick = [IntersectionSim(network, seed=seed, spawn_interval=spawn_interval).run(max_ticks) for network in networks]
+    event = [EventIntersectionSim(network, seed=seed, spawn_interval=spawn_interval).run(max_ticks)
+             for network in networks]
+    batch = BatchIntersectionSim(networks, seed=seed, spawn_interval=spawn_interval).run(max_ticks)
+    assert event == tick
+    assert np.array_equal(batch, tick)
+
+
+@pytest.mark.parametrize('profile', ['heavy', 'east-west-rush'])
+def test_engines_agree_on_scenario_traffic(networks, profile):
+    arrivals = scenarios.generate_arrivals(4, profile)
+    tick = [IntersectionSim(network, arrivals=scenarios.iter_arrivals(arrivals)).run(2000) for network in networks]
+    event = [EventIntersectionSim(network, arrivals=scenarios.iter_arrivals(arrivals)).run(2000) for network in networks]
+    batch = BatchIntersectionSim(networks, arrivals=scenarios.iter_arrivals(arrivals)).run(2000)
+    assert event == tick
+    assert np.array_equal(batch, tick)
+
+
+def test_early_abort_keeps_the_best(networks):
+    full = BatchIntersectionSim(networks, seed=2).run()
+    aborted = BatchIntersectionSim(networks, seed=2).run(early_abort=True)
+    assert aborted.max() == full.max()
+    assert (aborted <= full).all()
@@ -0,0 +1,54 @@
+import random
+import pytest
+
+import main
+from export import export_controller, load_controller, sample_inputs, check_equivalence
+
+EDGE_INPUTS = [(0.0, 0.0, 0), (0.0, 0.0, 1), (1e-300, 0.0, 1), (2e6, 2e6, 0), (1e9, 0.0, 1), (0.0, 1e9, 0),
+               (123456.0, 7.0, 1)]
+
+
+def mutated_genome(config, seed, mutations):
+    random.seed(seed)
+    genome = config.genome_type(seed)
+    genome.configure_new(config.genome_config)
+    for _ in range(mutations):
+        genome.mutate(config.genome_config)
+    genome.fitness = 0.0
+    return genome
+
+
+@pytest.fixture(scope='module')
+def config():
+    config = main.load_config()
+    config.genome_config.activation_options = ['sigmoid', 'tanh', 'relu', 'gauss', 'identity', 'clamped']
+    config.genome_config.activation_mutate_rate = 0.5
+    config.genome_config.aggregation_options = ['sum', 'product', 'max', 'min']
+    config.genome_config.aggregation_mutate_rate = 0.3
+    # Grow hidden layers rather than prune
+    config.genome_config.node_add_prob = 0.5
+    config.genome_config.conn_add_prob = 0.9
+    config.genome_config.node_delete_prob = 0.0
+    config.genome_config.conn_delete_prob = 0.0
+    return config
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_exported_controller_matches_network(config, tmp_path, seed):
+    genome = mutated_genome(config, seed, 5 + 5 * seed)
+    path = str(tmp_path / 'controller.py')
+    network = export_controller(genome, config, path)
+    controller = load_controller(path)
+    samples = sample_inputs(2000, seed) + EDGE_INPUTS
+    assert check_equivalence(network, controller, samples) == (0, 0.0)
+    for inputs in EDGE_INPUTS:
+        output = network.activate(list(inputs))[0]
+        assert controller.change_light(*inputs) == (output > 0.5 or output < 0.00001)
+
+
+def test_unsupported_aggregation_is_refused(config, tmp_path):
+    genome = mutated_genome(config, 0, 0)
+    for node in genome.nodes.values():
+        node.aggregation = 'median'
+    with pytest.raises(ValueError):
+        export_controller(genome, config, str(tmp_path / 'controller.py'))
@@ -0,0 +1,50 @@
+import random
+from time import perf_counter
+import pytest
+import neat
+
+import main
+import grid_sim
+from grid_sim import GridSim, GAP
+
+
+def random_network(seed):
+    config = main.load_config()
+    random.seed(seed)
+    genome = config.genome_type(seed)
+    genome.configure_new(config.genome_config)
+    return neat.nn.FeedForwardNetwork.create(genome, config)
+
+
+def gaps(sim):
+    # Distance from every car to the one ahead of it on the same segment
+    for s in range(sim.layout.num_segments):
+        car = sim.seg_head[s]
+        while car >= 0 and sim.behind[car] >= 0:
+            yield sim.pos[car] - sim.pos[sim.behind[car]]
+            car = sim.behind[car]
+
+
+@pytest.mark.parametrize('seed', [0, 3])
+def test_cars_keep_their_gap_through_merges(seed):
+    # Heavy traffic with many turns, so front cars of different segments often head for the same one
+    sim = GridSim(random_network(seed), 3, 3, seed=seed, spawn_interval=300, turn_prob=0.5, cars_to_finish=10 ** 9)
+    for _ in range(1500):
+        sim.step()
+        assert min(gaps(sim), default=GAP) >= GAP
+    assert sim.cars_finished > 0
+
+
+def test_fixed_seed_is_repeatable():
+    network = random_network(1)
+    assert GridSim(network, 2, 2, seed=4).run(3000) == GridSim(network, 2, 2, seed=4).run(3000)
+
+
+def test_time_budget_stops_the_run():
+    config = main.load_config()
+    genome = config.genome_type(0)
+    genome.configure_new(config.genome_config)
+    # Far more cars than could finish, so only max_seconds ends the run
+    start = perf_counter()
+    assert grid_sim.eval_genome(genome, config, 2, 2, seed=0, cars_to_finish=10 ** 9, max_seconds=0.2) > 0
+    assert perf_counter() - start < 5